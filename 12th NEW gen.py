@@ -3,14 +3,12 @@
 # Imports, DB Helpers, LED Simulation
 # ================================
 
-import os, sqlite3, threading, time
-from datetime import datetime
+import os, re, sqlite3, threading, time, functools, bisect
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 import customtkinter as ctk
 from tkinter import ttk, messagebox
-import matplotlib
-matplotlib.use("Agg")   # prevent crashes if GUI not ready
-from matplotlib.figure import Figure
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 
 # ----------------
 # DB Setup
@@ -18,27 +16,90 @@ from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_PATH = os.path.join(BASE_DIR, "pharmacy.db")
 
+# One long-lived connection per thread (opened lazily). The connection runs in
+# autocommit mode: single statements commit on their own, multi-statement
+# writes go through db_transaction(). WAL lets readers run while one writer holds
+# _db_write_lock.
+_db_local = threading.local()
+_db_write_lock = threading.RLock()
+_DB_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-65536",  # 64 MiB page cache per connection
+    "PRAGMA wal_autocheckpoint=1000",
+    "PRAGMA mmap_size=268435456",
+)
+_db_generation = 0  # bumped on every write; lets UI caches tell whether the data changed
+
+def _bump_generation():
+    global _db_generation
+    _db_generation += 1
+
 def db_connect():
-    return sqlite3.connect(DB_PATH, timeout=5)
+    conn = getattr(_db_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(DB_PATH, timeout=5, check_same_thread=False, isolation_level=None,
+                               cached_statements=512)
+        for pragma in _DB_PRAGMAS:
+            conn.execute(pragma)
+        _db_local.conn = conn
+    return conn
+
+@contextmanager
+def db_transaction():
+    """Group several writes into one BEGIN/COMMIT. Nested use joins the outer transaction."""
+    with _db_write_lock:
+        conn = db_connect()
+        if conn.in_transaction:
+            yield conn.cursor()
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn.cursor()
+        except BaseException:
+            conn.execute("ROLLBACK")
+            _invalidate_slot_grid()  # cached occupancy may hold rolled-back changes
+            raise
+        conn.execute("COMMIT")
+        _bump_generation()
 
 def db_exec(sql, params=(), commit=True):
-    with db_connect() as conn:
-        cur = conn.cursor()
+    # `commit` is kept for older call sites; outside db_transaction() every
+    # statement already commits on its own.
+    with _db_write_lock:
+        cur = db_connect().cursor()
         cur.execute(sql, params)
-        if commit: conn.commit()
+        _bump_generation()
         return cur
 
 def db_fetchone(sql, params=()):
-    with db_connect() as conn:
-        cur = conn.cursor()
-        cur.execute(sql, params)
-        return cur.fetchone()
+    cur = db_connect().cursor()
+    cur.execute(sql, params)
+    return cur.fetchone()
 
 def db_fetchall(sql, params=()):
-    with db_connect() as conn:
-        cur = conn.cursor()
-        cur.execute(sql, params)
-        return cur.fetchall()
+    cur = db_connect().cursor()
+    cur.execute(sql, params)
+    return cur.fetchall()
+
+def db_iter(sql, params=(), batch=200):
+    """Stream rows in fetchmany batches instead of materializing the whole result."""
+    cur = db_connect().cursor()
+    cur.execute(sql, params)
+    while True:
+        rows = cur.fetchmany(batch)
+        if not rows:
+            return
+        yield from rows
+
+# Hot lookups share one SQL text so they reuse a single prepared statement
+# from the connection's statement cache.
+SQL_SLOT_ID_AT = "SELECT id FROM slots WHERE shelf=? AND row=? AND col=?"
+SQL_SLOT_STATE_AT = "SELECT id, occupied FROM slots WHERE shelf=? AND row=? AND col=?"
+SQL_SLOT_POS = "SELECT shelf,row,col FROM slots WHERE id=?"
+SQL_PRESC_SLOT = "SELECT slot_id, basket_size FROM prescriptions WHERE id=?"
+SQL_PATIENT_NAME = "SELECT name FROM patients WHERE id=?"
 
 # ----------------
 # Actions Log
@@ -53,90 +114,115 @@ def init_actions_table():
 
 def log_action(action, actor="system"):
     db_exec("INSERT INTO actions_log(ts,actor,action) VALUES(?,?,?)",
-            (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), actor, action))
+            (time.strftime("%Y-%m-%d %H:%M:%S"), actor, action))
 
-def get_todays_actions(limit=300):
-    today = datetime.now().strftime("%Y-%m-%d")
+def get_todays_actions(limit=300, offset=0):
+    # ts range (not LIKE) so idx_actions_ts(ts,id) both filters and orders the rows;
+    # INDEXED BY keeps the planner from walking the rowid backwards instead
+    today = datetime.now().date()
     return db_fetchall("""SELECT ts,actor,action
-                          FROM actions_log
-                          WHERE ts LIKE ?
-                          ORDER BY id DESC
-                          LIMIT ?""", (today+"%", limit))
+                          FROM actions_log INDEXED BY idx_actions_ts
+                          WHERE ts >= ? AND ts < ?
+                          ORDER BY ts DESC, id DESC
+                          LIMIT ? OFFSET ?""",
+                       (f"{today} 00:00:00", f"{today + timedelta(days=1)} 00:00:00", limit, offset))
 # --- PATCH 1: Ensure all popup windows are always on top ---
-def make_topmost(win):
-    """Force popup window to appear above its parent and take focus."""
+def make_topmost(win, modal=True):
+    """Force popup window to appear above its parent and take focus.
+    Callers shouldn't lift/set -topmost themselves; this does it once."""
     win.lift()
     win.focus_force()
-    win.grab_set()        # locks input until closed
+    if modal:
+        win.grab_set()    # locks input until closed
     win.attributes("-topmost", True)
     win.after_idle(lambda: win.attributes("-topmost", False))
 # --- END PATCH 1 ---
 
+# Small popups shown over and over (slot confirm / manual assign) are built once
+# per (kind, parent) and then hidden and re-shown instead of destroyed.
+_popup_pool = {}
+
+def pooled_popup(parent, kind, build):
+    """Show the pooled `kind` popup for `parent`, calling build(win) to create its widgets the first time."""
+    key = (kind, str(parent))
+    win = _popup_pool.get(key)
+    if win is None or not win.winfo_exists():
+        for k in [k for k, w in _popup_pool.items() if not w.winfo_exists()]:
+            del _popup_pool[k]  # parent was closed, taking its popups with it
+        win = ctk.CTkToplevel(parent)
+        build(win)
+        win.protocol("WM_DELETE_WINDOW", lambda: hide_popup(win))
+        _popup_pool[key] = win
+    else:
+        win.deiconify()
+    make_topmost(win)
+    return win
+
+def hide_popup(win):
+    win.grab_release()
+    win.withdraw()
+
 # ----------------
 # LED Simulation
 # ----------------
+# All active groups are driven by one Tk timer (see start_blink_scheduler)
+# instead of a sleeping thread per group.
 _blink_groups = {}
+_blink_root = None
+BLINK_INTERVAL_MS = 500
 
 def slot_id_to_label(slot_id):
-    r = db_fetchone("SELECT shelf,row,col FROM slots WHERE id=?", (slot_id,))
-    if not r: return ""
-    s, rrow, c = r
-    return f"{s}-{rrow}{c}"
+    return slot_labels().get(slot_id, "")
 
-def slot_ids_to_labels(slot_ids):
-    return [slot_id_to_label(s) for s in slot_ids if s]
-
-def _blink_worker(group_key):
-    ctrl = _blink_groups[group_key]
-    stop, pause = ctrl["stop"], ctrl["pause"]
-    labels = slot_ids_to_labels(ctrl["slots"])
-    color = ctrl["color"]
-    while not stop.is_set():
-        if pause.is_set():
-            time.sleep(0.25); continue
-        print(f"[LED] ON {labels} ({color})")
-        time.sleep(0.5)
-        print(f"[LED] OFF {labels}")
-        time.sleep(0.5)
+def start_blink_scheduler(root):
+    """Start the shared LED timer on the Tk root (call once at app start)."""
+    global _blink_root
+    _blink_root = root
+    root.after(BLINK_INTERVAL_MS, _blink_tick)
+
+def _blink_tick():
+    for ctrl in list(_blink_groups.values()):
+        if ctrl["paused"]:
+            continue
+        ctrl["on"] = not ctrl["on"]
+        if ctrl["on"]:
+            print(f"[LED] ON {ctrl['labels']} ({ctrl['color']})")
+        else:
+            print(f"[LED] OFF {ctrl['labels']}")
+    _blink_root.after(BLINK_INTERVAL_MS, _blink_tick)
 
 def start_blink(slots, color="yellow"):
     if not slots: return None
     key = int(slots[0])
     stop_blink(key)
-    stop = threading.Event(); pause = threading.Event()
-    th = threading.Thread(target=_blink_worker, args=(key,), daemon=True)
-    _blink_groups[key] = {"stop": stop, "pause": pause, "thread": th,
-                          "slots": list(slots), "color": color}
-    th.start()
+    labels = slot_ids_to_labels(slots)
+    _blink_groups[key] = {"slots": list(slots), "labels": labels, "color": color,
+                          "paused": False, "on": True}
+    print(f"[LED] ON {labels} ({color})")
     return key
 
 def pause_toggle(group_key):
     ctrl = _blink_groups.get(group_key)
     if not ctrl: return
-    if ctrl["pause"].is_set():
-        ctrl["pause"].clear(); print("[LED] resume")
-    else:
-        ctrl["pause"].set(); print("[LED] pause")
+    ctrl["paused"] = not ctrl["paused"]
+    print("[LED] pause" if ctrl["paused"] else "[LED] resume")
 
 def stop_blink(slots_or_key):
     if slots_or_key is None: return
     if isinstance(slots_or_key, int):
-        ctrl = _blink_groups.pop(slots_or_key, None)
-        if ctrl: ctrl["stop"].set()
+        _blink_groups.pop(slots_or_key, None)
         return
-    key = int(slots_or_key[0])
-    ctrl = _blink_groups.pop(key, None)
-    if ctrl: ctrl["stop"].set()
+    _blink_groups.pop(int(slots_or_key[0]), None)
 
 def open_led_popup(parent, slots, color="yellow", title="LED Control"):
     if not slots:
         messagebox.showinfo("LED", "No slots to blink."); return
     key = start_blink(slots, color)
     win = ctk.CTkToplevel(parent); win.title(title)
-    win.geometry("520x160"); win.lift(); win.attributes("-topmost", True)
+    win.geometry("520x160")
     make_topmost(win)
     ctk.CTkLabel(win, text=f"Blinking: {', '.join(slot_ids_to_labels(slots))}",
-                 font=ctk.CTkFont(size=16)).pack(padx=14, pady=(14,6))
+                 font=app_font(16)).pack(padx=14, pady=(14,6))
     btn = ctk.CTkButton(win, text="⏸ Pause Lights", width=140,
                         command=lambda: _toggle_pause(btn, key))
     btn.pack(side="left", padx=12, pady=12)
@@ -155,8 +241,11 @@ def _toggle_pause(button, key):
 # DB Schema Init
 # ----------------
 def init_db():
-    with db_connect() as conn:
-        cur = conn.cursor()
+    # WAL is persistent in the DB file; warn if the filesystem refused it
+    mode = db_fetchone("PRAGMA journal_mode=WAL")[0]
+    if str(mode).lower() != "wal":
+        print("SQLite WAL mode unavailable, using journal_mode:", mode)
+    with db_transaction() as cur:
         # Ensure all main tables exist
         cur.execute("""CREATE TABLE IF NOT EXISTS patients(
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -198,7 +287,64 @@ def init_db():
             actor TEXT,
             action TEXT
         )""")
-        conn.commit()
+        # Indices backing slot-position probes, per-row free-slot scans,
+        # prescription joins and the actions log
+        cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_slots_pos ON slots(shelf,row,col)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_slots_shelf_row_occ ON slots(shelf,row,occupied,col)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_presc_patient_slot ON prescriptions(patient_id,slot_id)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_presc_slot_nn ON prescriptions(slot_id) WHERE slot_id IS NOT NULL")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_slots_shelf_occ ON slots(shelf,occupied)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_actions_ts ON actions_log(ts,id)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_presc_date_added ON prescriptions(date_added)")
+        # patient list sort orders (see App.refresh_patient_table)
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_patients_name_nocase ON patients(name COLLATE NOCASE)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_patients_addr_nocase ON patients(address COLLATE NOCASE, name COLLATE NOCASE)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_patients_created ON patients(created_at)")
+        # family-bin lookup matches addresses ignoring case and surrounding blanks
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_patients_addr_norm ON patients(lower(trim(address)))")
+        # prescriptions has no FK to patients (and one can't be added in place), so cascade by trigger
+        cur.execute("""CREATE TRIGGER IF NOT EXISTS trg_patients_delete AFTER DELETE ON patients
+            BEGIN DELETE FROM prescriptions WHERE patient_id = OLD.id; END""")
+    init_patient_search()
+
+# ----- Patient full-text search -----
+# One FTS5 row per patient (rowid = patient id) holding name, address and all
+# medications; triggers rebuild a patient's row whenever any of those change.
+_patient_search = False  # True once the FTS5 table is available
+_SEARCH_ROW_SQL = """INSERT INTO patient_search(rowid,name,address,medication)
+    SELECT p.id, p.name, p.address,
+           (SELECT group_concat(medication,' ') FROM prescriptions WHERE patient_id = p.id)
+    FROM patients p"""
+_SEARCH_TRIGGERS = (
+    ("trg_ps_patient_ins", "INSERT ON patients", ("NEW.id",)),
+    ("trg_ps_patient_upd", "UPDATE OF name,address ON patients", ("NEW.id",)),
+    ("trg_ps_patient_del", "DELETE ON patients", ("OLD.id",)),
+    ("trg_ps_rx_ins", "INSERT ON prescriptions", ("NEW.patient_id",)),
+    ("trg_ps_rx_upd", "UPDATE OF medication,patient_id ON prescriptions", ("OLD.patient_id", "NEW.patient_id")),
+    ("trg_ps_rx_del", "DELETE ON prescriptions", ("OLD.patient_id",)),
+)
+
+def init_patient_search():
+    global _patient_search
+    try:
+        with db_transaction() as cur:
+            created = not cur.execute("SELECT 1 FROM sqlite_master WHERE name='patient_search'").fetchone()
+            cur.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS patient_search
+                           USING fts5(name, address, medication, tokenize='unicode61 remove_diacritics 1')""")
+            for name, event, pids in _SEARCH_TRIGGERS:
+                body = "".join(f"DELETE FROM patient_search WHERE rowid = {pid}; "
+                               f"{_SEARCH_ROW_SQL} WHERE p.id = {pid}; " for pid in pids)
+                cur.execute(f"CREATE TRIGGER IF NOT EXISTS {name} AFTER {event} BEGIN {body}END")
+            if created:
+                cur.execute(_SEARCH_ROW_SQL)
+        _patient_search = True
+    except sqlite3.OperationalError as e:
+        print("Full-text search unavailable, falling back to LIKE:", e)
+
+def fts_prefix_query(text):
+    """'smith 12 main' -> '"smith"* "12"* "main"*' (every word as a prefix, ANDed)."""
+    return " ".join(f'"{w}"*' for w in re.findall(r"\w+", text))
+
 # ================================
 # Pharmacy LED System - Part 2
 # Slot & Section Utilities, Overdue Logic
@@ -210,6 +356,9 @@ def init_db():
 # ================================
 
 # ----- Basic helpers for rows/cols/labels -----
+_BOUND_RE = re.compile(r"^([A-Z])(\d+)$")                # 'A12'
+_LABEL_RE = re.compile(r"^([^-]+)-([A-Z])-?(\d+)$")      # 'F-A12' or 'F-A-12'
+
 def rows_range(start_row, end_row):
     return [chr(i) for i in range(ord(start_row), ord(end_row) + 1)]
 
@@ -217,27 +366,40 @@ def parse_bound(bound_text):
     """Parse 'A1' -> ('A', 1). Returns None if invalid."""
     if not bound_text:
         return None
-    s = bound_text.strip().upper()
-    if len(s) < 2:
-        return None
-    row = s[0]
-    if not row.isalpha():
-        return None
-    try:
-        col = int(s[1:])
-    except Exception:
-        return None
-    if not (row >= 'A' and row <= 'Z'):
+    m = _BOUND_RE.match(bound_text.strip().upper())
+    if not m:
         return None
-    if col <= 0:
-        return None
-    return (row, col)
+    col = int(m.group(2))
+    return (m.group(1), col) if col > 0 else None
 
+@functools.lru_cache(maxsize=8192)
 def slot_id_to_tuple(slot_id):
-    r = db_fetchone("SELECT shelf,row,col FROM slots WHERE id=?", (slot_id,))
+    r = db_fetchone(SQL_SLOT_POS, (slot_id,))
     if not r: return None
     return (r[0], r[1], r[2])  # (shelf, row, col)
 
+# ----- Slot label map: {slot id: 'F-A12'}, built once and rebuilt after layout edits -----
+SLOT_LABELS = None  # None = not loaded (an empty dict is a loaded, slot-less layout)
+
+def load_slot_labels():
+    global SLOT_LABELS
+    SLOT_LABELS = {sid: f"{shelf}-{row}{col}" for sid, shelf, row, col in
+                   db_fetchall("SELECT id,shelf,row,col FROM slots")}
+    return SLOT_LABELS
+
+def slot_labels():
+    return SLOT_LABELS if SLOT_LABELS is not None else load_slot_labels()
+
+def _invalidate_slot_cache():
+    """Drop memoized slot geometry; call after slots are added, renamed or deleted."""
+    global SLOT_LABELS
+    _invalidate_slot_grid()
+    SLOT_LABELS = None  # reloaded on next lookup
+    slot_id_to_tuple.cache_clear()
+    label_to_slot_id.cache_clear()
+    format_slot_label_for_patient.cache_clear()
+
+@functools.lru_cache(maxsize=16384)
 def label_to_slot_id(label):
     """
     Accepts:
@@ -250,27 +412,15 @@ def label_to_slot_id(label):
     if s.isdigit():
         row = db_fetchone("SELECT id FROM slots WHERE id=?", (int(s),))
         return int(s) if row else None
-    parts = s.split("-")
-    if len(parts) == 2:
-        shelf, rowcol = parts
-        if len(rowcol) >= 2:
-            row = rowcol[0]
-            try: col = int(rowcol[1:])
-            except: return None
-            r = db_fetchone("SELECT id FROM slots WHERE shelf=? AND row=? AND col=?",
-                            (shelf, row, col))
-            return r[0] if r else None
-    if len(parts) == 3:
-        shelf, row, coltxt = parts
-        try: col = int(coltxt)
-        except: return None
-        r = db_fetchone("SELECT id FROM slots WHERE shelf=? AND row=? AND col=?",
-                        (shelf, row, col))
-        return r[0] if r else None
-    return None
+    m = _LABEL_RE.match(s)
+    if not m:
+        return None
+    r = db_fetchone(SQL_SLOT_ID_AT, (m.group(1), m.group(2), int(m.group(3))))
+    return r[0] if r else None
 # ----- Large-basket helpers (no schema change) -----
 def slot_ids_to_labels(slot_ids):
-    return [slot_id_to_label(s) for s in slot_ids if s]
+    labels = slot_labels()
+    return [labels.get(s, "") for s in slot_ids if s]
 
 def next_col_partner_slot_id(primary_slot_id):
     """Return the adjacent partner slot id (same shelf/row, col+1) or None."""
@@ -278,7 +428,7 @@ def next_col_partner_slot_id(primary_slot_id):
     if not tpl:
         return None
     shelf, row, col = tpl
-    r = db_fetchone("SELECT id FROM slots WHERE shelf=? AND row=? AND col=?", (shelf, row, col + 1))
+    r = db_fetchone(SQL_SLOT_ID_AT, (shelf, row, col + 1))
     return r[0] if r else None
 
 def expand_slots_for_large_display_or_freeing(presc_id):
@@ -287,7 +437,7 @@ def expand_slots_for_large_display_or_freeing(presc_id):
     - small: [slot_id]
     - large: [slot_id, partner_if_exists]
     """
-    rec = db_fetchone("SELECT slot_id, basket_size FROM prescriptions WHERE id=?", (presc_id,))
+    rec = db_fetchone(SQL_PRESC_SLOT, (presc_id,))
     if not rec:
         return []
     sid, basket = rec
@@ -298,6 +448,18 @@ def expand_slots_for_large_display_or_freeing(presc_id):
     partner = next_col_partner_slot_id(sid)
     return [sid, partner] if partner else [sid]
 
+def patient_slots_for_freeing(patient_id):
+    """Sorted distinct slot ids held by a patient's prescriptions, large-basket partners included."""
+    rows = db_fetchall("""
+        SELECT slot_id FROM prescriptions WHERE patient_id=? AND slot_id IS NOT NULL
+        UNION
+        SELECT b.id FROM prescriptions pr
+        JOIN slots a ON a.id = pr.slot_id
+        JOIN slots b ON b.shelf = a.shelf AND b.row = a.row AND b.col = a.col + 1
+        WHERE pr.patient_id=? AND LOWER(COALESCE(pr.basket_size,'small')) = 'large'
+        ORDER BY 1""", (patient_id, patient_id))
+    return [r[0] for r in rows]
+
 def pretty_location_for_prescription(patient_id, presc_id, basket, slot_id):
     """
     Build a location string for a row in the UI.
@@ -311,7 +473,7 @@ def pretty_location_for_prescription(patient_id, presc_id, basket, slot_id):
 
     # For large, compute partner and format both
     sname, row, col = slot_id_to_tuple(slot_id)
-    partner = db_fetchone("SELECT id FROM slots WHERE shelf=? AND row=? AND col=?", (sname, row, col + 1))
+    partner = db_fetchone(SQL_SLOT_ID_AT, (sname, row, col + 1))
     labels = [format_slot_label_for_patient(patient_id, slot_id)]
     if partner and partner[0]:
         labels.append(format_slot_label_for_patient(patient_id, partner[0]))
@@ -325,11 +487,11 @@ def populate_slots_for_shelf(shelf_name, rows_count, cols_count):
     existing = db_fetchone("SELECT COUNT(*) FROM slots WHERE shelf=?", (shelf_name,))
     if existing and existing[0] > 0:
         return  # already populated
-    for i in range(rows_count):
-        row_letter = chr(ord('A') + i)
-        for col in range(1, cols_count + 1):
-            db_exec("INSERT INTO slots(shelf,row,col,occupied) VALUES(?,?,?,0)",
-                    (shelf_name, row_letter, col))
+    rows = [(shelf_name, chr(ord('A') + i), col) for i in range(rows_count) for col in range(1, cols_count + 1)]
+    with db_transaction() as cur:
+        cur.executemany("INSERT INTO slots(shelf,row,col,occupied) VALUES(?,?,?,0)", rows)
+    db_exec("ANALYZE")  # refresh planner stats for the new rows
+    _invalidate_slot_cache()
 
 def populate_all_slots_from_shelves():
     """
@@ -339,44 +501,66 @@ def populate_all_slots_from_shelves():
     for name, rows_count, cols_count in shelves:
         populate_slots_for_shelf(name, rows_count or 26, cols_count or 100)
 
+def get_shelf_usage():
+    """[(shelf, rows_count, cols_count, used, total)] for every shelf, in one grouped query."""
+    return db_fetchall("""
+        SELECT s.name, s.rows_count, s.cols_count, COALESCE(u.used, 0), COALESCE(u.total, 0)
+        FROM shelves s
+        LEFT JOIN (SELECT shelf, SUM(occupied = 1) AS used, COUNT(*) AS total
+                   FROM slots GROUP BY shelf) u ON u.shelf = s.name
+        ORDER BY s.name
+    """)
+
+def get_dashboard_counts():
+    """(patients, prescriptions, assigned prescriptions) in one round-trip."""
+    return db_fetchone("""SELECT (SELECT COUNT(*) FROM patients),
+                                 (SELECT COUNT(*) FROM prescriptions),
+                                 (SELECT COUNT(*) FROM prescriptions WHERE slot_id IS NOT NULL)""")
+
 # ----- OCCUPANCY INTEGRITY REPAIR -----
-def repair_slot_occupancy():
+# Set by writes that can leave slots.occupied out of step with prescriptions:
+# freeing slots (the bin may still be shared by a family member), family
+# binning, and anything that goes through _invalidate_slot_grid. Occupying the
+# free slots the allocator picked keeps them in step and leaves it alone.
+# Cleared by a completed repair.
+_occupancy_dirty = True
+
+def _mark_occupancy_dirty():
+    global _occupancy_dirty
+    _occupancy_dirty = True
+
+def repair_slot_occupancy(force=False):
     """
     Canonicalize occupancy:
     - set all to 0,
     - mark occupied for every prescription's slot_id,
     - if basket=large, also mark partner slot occupied.
+    Skipped when nothing was written since the last repair, unless force=True.
     """
-    with db_connect() as conn:
-        cur = conn.cursor()
+    global _occupancy_dirty
+    if not (_occupancy_dirty or force):
+        return
+    with db_transaction() as cur:
         cur.execute("UPDATE slots SET occupied=0")
-
-        # Fetch prescriptions with basket size
-        cur.execute("SELECT id, slot_id, basket_size FROM prescriptions WHERE slot_id IS NOT NULL")
-        rows = cur.fetchall()
-
-        seen = set()
-        for presc_id, sid, basket in rows:
-            if not sid:
-                continue
-            basket = (basket or "small").lower()
-            if basket == "large":
-                partner = next_col_partner_slot_id(sid)  # <== already exists in your code
-                if partner:
-                    seen.add(partner)
-            seen.add(sid)
-
-        # Mark all collected slots occupied
-        for sid in seen:
-            cur.execute("UPDATE slots SET occupied=1 WHERE id=?", (sid,))
-        conn.commit()
+        # prescription slots, plus the col+1 partner of every large basket
+        cur.execute("""UPDATE slots SET occupied=1
+                       WHERE id IN (SELECT slot_id FROM prescriptions WHERE slot_id IS NOT NULL)
+                          OR id IN (SELECT s2.id FROM prescriptions p
+                                    JOIN slots s1 ON s1.id = p.slot_id
+                                    JOIN slots s2 ON s2.shelf = s1.shelf AND s2.row = s1.row AND s2.col = s1.col + 1
+                                    WHERE LOWER(COALESCE(p.basket_size,'small')) = 'large')""")
+        # patch the allocator's loaded cells in place rather than dropping the grid
+        if _slot_grid_cells:
+            for sid, occ in cur.execute("SELECT id, occupied FROM slots"):
+                cell = _slot_grid_cells.get(sid)
+                if cell: cell[1] = occ
+    _occupancy_dirty = False
 
 
 # ----- Letter sections -----
-def get_letter_section(letter):
-    r = db_fetchone("SELECT shelf,lower_bound,upper_bound FROM letter_sections WHERE letter=?", (letter,))
-    if not r: return None
-    shelf, lower, upper = r
+_letter_sections = None  # {letter: parsed section or None}, loaded on first use
+
+def _parse_section(shelf, lower, upper):
     if not shelf or not lower or not upper:
         return None
     lo = parse_bound(lower)
@@ -385,64 +569,93 @@ def get_letter_section(letter):
         return None
     return (shelf, lo[0], lo[1], up[0], up[1])  # (shelf, start_row, start_col, end_row, end_col)
 
+def _invalidate_letter_sections():
+    """Drop the parsed section table; call after letter_sections rows change."""
+    global _letter_sections
+    _letter_sections = None
+    format_slot_label_for_patient.cache_clear()
+
+def get_letter_section(letter):
+    global _letter_sections
+    if _letter_sections is None:
+        _letter_sections = {L: _parse_section(s, lo, up) for L, s, lo, up in
+                            db_fetchall("SELECT letter,shelf,lower_bound,upper_bound FROM letter_sections")}
+    return _letter_sections.get(letter)
+
 def get_overflow_section():
     return get_letter_section("Overflow")
 
 # ----- Slot occupancy helpers -----
+def _set_slots_occupied(slot_ids, value):
+    if not value:
+        _mark_occupancy_dirty()  # a freed bin may still hold a family member's prescription
+    ids = list(slot_ids)
+    with db_transaction() as cur:
+        for i in range(0, len(ids), 900):  # stay under SQLite's host-parameter limit
+            chunk = ids[i:i + 900]
+            cur.execute("UPDATE slots SET occupied=? WHERE id IN (%s)" % ",".join("?" * len(chunk)),
+                        [value] + chunk)
+    _patch_slot_grid(ids, value)
+
 def mark_slots_occupied(slot_ids):
     if not slot_ids: return
-    with db_connect() as conn:
-        cur = conn.cursor()
-        for sid in slot_ids:
-            cur.execute("UPDATE slots SET occupied=1 WHERE id=?", (sid,))
-        conn.commit()
+    _set_slots_occupied(slot_ids, 1)
 
 def mark_slots_free(slot_ids):
     if not slot_ids: return
-    with db_connect() as conn:
-        cur = conn.cursor()
-        for sid in slot_ids:
-            cur.execute("UPDATE slots SET occupied=0 WHERE id=?", (sid,))
-        conn.commit()
+    _set_slots_occupied(slot_ids, 0)
 
 def get_slot_by_position(shelf, row, col):
-    return db_fetchone("SELECT id, occupied FROM slots WHERE shelf=? AND row=? AND col=?",
-                       (shelf, row, col))
+    return db_fetchone(SQL_SLOT_STATE_AT, (shelf, row, col))
+
+# ----- In-memory occupancy grid -----
+# Per-shelf copy of slots used by the allocator: {shelf: (sorted [(row, col)], {(row, col): [id, occupied]})}.
+# Occupancy writes patch loaded cells through _patch_slot_grid; a slot layout
+# change or a rolled-back write calls _invalidate_slot_grid().
+_slot_grid = {}
+_slot_grid_cells = {}  # slot id -> the [id, occupied] cell in _slot_grid
+
+def _invalidate_slot_grid():
+    _mark_occupancy_dirty()  # every caller has just rewritten occupancy or slot layout
+    _slot_grid.clear()
+    _slot_grid_cells.clear()
+
+def _patch_slot_grid(slot_ids, value):
+    """Bring loaded grid cells in step with an occupancy write instead of dropping the grid."""
+    for sid in slot_ids:
+        cell = _slot_grid_cells.get(sid)
+        if cell: cell[1] = value
+
+def _load_shelf(shelf):
+    grid = _slot_grid.get(shelf)
+    if grid is None:
+        cells = {}
+        for sid, row, col, occ in db_iter("SELECT id,row,col,occupied FROM slots WHERE shelf=?", (shelf,)):
+            cells[(row, col)] = _slot_grid_cells[sid] = [sid, occ]
+        grid = _slot_grid[shelf] = (sorted(cells), cells)
+    return grid
 
 # ----- Section search -----
 def find_slot_in_section(shelf_name, start_row, start_col, end_row, end_col, basket_size):
     """
-    Iterate in order: rows start_row..end_row, columns start_col..end_col (progressive).
+    First free slot in order: rows start_row..end_row, columns start_col..end_col (progressive).
     Returns ([slot_ids], shelf_name) for small (1 slot) or large (2 consecutive columns) basket.
+    Walks the shelf's in-memory grid; (row, col) tuples sort in the same order as the section.
     """
-    rows = rows_range(start_row, end_row)
-    with db_connect() as conn:
-        cur = conn.cursor()
-        for r in rows:
-            c_start = start_col if r == start_row else 1
-            c_end = end_col if r == end_row else 10_000  # safe cap
-            max_col_row = db_fetchone("SELECT MAX(col) FROM slots WHERE shelf=? AND row=?", (shelf_name, r))
-            if not max_col_row or not max_col_row[0]:
-                continue
-            c_end = min(c_end, max_col_row[0])
-
-            for c in range(c_start, c_end + 1):
-                cur.execute("SELECT id,occupied FROM slots WHERE shelf=? AND row=? AND col=?",
-                            (shelf_name, r, c))
-                row1 = cur.fetchone()
-                if not row1:
-                    continue
-                sid, occ = row1
-                if occ != 0:
-                    continue
-                if basket_size == "large":
-                    cur.execute("SELECT id,occupied FROM slots WHERE shelf=? AND row=? AND col=?",
-                                (shelf_name, r, c+1))
-                    row2 = cur.fetchone()
-                    if row2 and row2[1] == 0:
-                        return ([sid, row2[0]], shelf_name)
-                else:
-                    return ([sid], shelf_name)
+    keys, cells = _load_shelf(shelf_name)
+    end = (end_row, end_col)
+    for i in range(bisect.bisect_left(keys, (start_row, start_col)), len(keys)):
+        pos = keys[i]
+        if pos > end:
+            break
+        sid, occ = cells[pos]
+        if occ:
+            continue
+        if basket_size != "large":
+            return ([sid], shelf_name)
+        partner = cells.get((pos[0], pos[1] + 1))
+        if partner and not partner[1]:
+            return ([sid, partner[0]], shelf_name)
     return None
 
 def find_next_available_slot_primary(letter, basket_size):
@@ -465,12 +678,21 @@ def find_next_available_slot_with_overflow(letter, basket_size):
     return None
 
 # ----- Patient letter & wrong-section checks -----
-def get_patient_letter(patient_id):
-    name = db_fetchone("SELECT name FROM patients WHERE id=?", (patient_id,))
-    if not name or not name[0]:
+def _letter_from_name(name):
+    if not name or not name.strip():
         return "A"
-    last = name[0].strip().split()[-1]
-    return last[0].upper() if last else "A"
+    return name.strip().split()[-1][0].upper()
+
+@functools.lru_cache(maxsize=4096)
+def get_patient_letter(patient_id):
+    name = db_fetchone(SQL_PATIENT_NAME, (patient_id,))
+    return _letter_from_name(name[0] if name else None)
+
+def _slot_in_section(sec, slot):
+    shelf, sr, sc, er, ec = sec
+    sname, row, col = slot
+    return (sname == shelf and sr <= row <= er
+            and not (row == sr and col < sc) and not (row == er and col > ec))
 
 def is_slot_in_letter_section(letter, slot_id):
     """Overflow exempt; returns True if slot is within the letter's section bounds."""
@@ -479,21 +701,12 @@ def is_slot_in_letter_section(letter, slot_id):
     sec = get_letter_section(letter)
     if not sec:
         return True  # if no defined section, don't flag as wrong
-    shelf, sr, sc, er, ec = sec
     slot = slot_id_to_tuple(slot_id)
     if not slot:
         return True
-    sname, row, col = slot
-    if sname != shelf:
-        return False
-    if row < sr or row > er:
-        return False
-    if row == sr and col < sc:
-        return False
-    if row == er and col > ec:
-        return False
-    return True
+    return _slot_in_section(sec, slot)
 
+@functools.lru_cache(maxsize=4096)
 def format_slot_label_for_patient(patient_id, slot_id):
     """Return 'F-A12' or 'F-A12 (⚠ Wrong Section — Move)'."""
     if not slot_id:
@@ -506,6 +719,36 @@ def format_slot_label_for_patient(patient_id, slot_id):
         return f"{lbl} (⚠ Wrong Section — Move)"
     return lbl
 
+def format_patient_locations(patient_names):
+    """
+    Bulk form of format_slot_label_for_patient for list views.
+    patient_names: {patient_id: name}. Returns {patient_id: [label, ...]} with the
+    distinct slots of each patient, in first-prescription order.
+    """
+    out = {pid: [] for pid in patient_names}
+    pids = list(patient_names)
+    for i in range(0, len(pids), 900):
+        chunk = pids[i:i + 900]
+        rows = db_fetchall("""
+            SELECT pr.patient_id, s.shelf, s.row, s.col
+            FROM prescriptions pr
+            JOIN slots s ON s.id = pr.slot_id
+            WHERE pr.patient_id IN (%s)
+            GROUP BY pr.patient_id, pr.slot_id
+            ORDER BY MIN(pr.id)
+        """ % ",".join("?" * len(chunk)), chunk)
+        for pid, shelf, row, col in rows:
+            sec = get_letter_section(_letter_from_name(patient_names[pid]))
+            out[pid].append(section_checked_label(sec, shelf, row, col))
+    return out
+
+def section_checked_label(sec, shelf, row, col):
+    """'F-A12', or 'F-A12 (⚠ Wrong Section — Move)' when outside `sec` (a get_letter_section tuple)."""
+    lbl = f"{shelf}-{row}{col}"
+    if sec and not _slot_in_section(sec, (shelf, row, col)):
+        return f"{lbl} (⚠ Wrong Section — Move)"
+    return lbl
+
 # ----- Family bins by address -----
 def find_family_bins_by_address(address):
     """
@@ -513,24 +756,31 @@ def find_family_bins_by_address(address):
     """
     if not address:
         return []
+    # one row per bin; MIN(pr.id) makes p.id/p.name come from the bin's first prescription.
+    # Both sides are normalized in SQL so the probe hits idx_patients_addr_norm.
     rows = db_fetchall("""
-        SELECT DISTINCT p.id, p.name, pr.slot_id
+        SELECT p.id, p.name, pr.slot_id, MIN(pr.id)
         FROM patients p
         JOIN prescriptions pr ON pr.patient_id = p.id
-        WHERE p.address = ? AND pr.slot_id IS NOT NULL
+        WHERE lower(trim(p.address)) = lower(trim(?)) AND pr.slot_id IS NOT NULL
+        GROUP BY pr.slot_id
+        ORDER BY MIN(pr.id)
     """, (address,))
-    out = []
-    seen = set()
-    for pid, name, slot_id in rows:
-        if not slot_id or slot_id in seen:
-            continue
-        seen.add(slot_id)
-        out.append((pid, name, slot_id))
-    return out
+    return [(pid, name, slot_id) for pid, name, slot_id, _first in rows]
 
 # ----- Overdue logic -----
 def parse_any_date(s):
+    # Legacy helper; overdue filtering now happens in SQL (get_overdue_prescriptions)
     if not s: return None
+    try:
+        # the two layouts this app writes, built without strptime
+        if len(s) == 19 and s[4] == s[7] == "-" and s[10] == " ":
+            return datetime(int(s[0:4]), int(s[5:7]), int(s[8:10]),
+                            int(s[11:13]), int(s[14:16]), int(s[17:19]))
+        if len(s) == 10 and s[4] == s[7] == "-":
+            return datetime(int(s[0:4]), int(s[5:7]), int(s[8:10]))
+    except ValueError:
+        pass
     for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d"):
         try:
             return datetime.strptime(s, fmt)
@@ -538,48 +788,78 @@ def parse_any_date(s):
             pass
     return None
 
-def get_overdue_prescriptions(min_days_over=14):
+@functools.lru_cache(maxsize=4096)
+def display_date(s):
+    """Stored 'YYYY-MM-DD[ HH:MM:SS]' -> 'MM/DD/YYYY' for tables ('' if unparseable)."""
+    if s and (len(s) == 10 or (len(s) == 19 and s[10] == " ")) and s[4] == s[7] == "-":
+        return f"{s[5:7]}/{s[8:10]}/{s[0:4]}"  # the format this app writes; no strptime needed
+    d = parse_any_date(s)
+    return d.strftime("%m/%d/%Y") if d else ""
+
+# Overdue filter shared by the queries below. The cutoff is a plain comparison on
+# the stored 'YYYY-MM-DD[ HH:MM:SS]' text (served by idx_presc_date_added);
+# dates SQLite can't read are skipped, as parse_any_date used to skip them.
+SQL_OVERDUE_WHERE = """pr.date_added <= datetime('now','localtime',?)
+          AND julianday(pr.date_added) IS NOT NULL"""
+
+def _overdue_cutoff(min_days_over):
+    """datetime() modifier for the cutoff; a negative threshold reaches into the future."""
+    return f"{-int(min_days_over)} days"
+
+def get_overdue_prescriptions(min_days_over=14, patient_id=None):
+    # Age is computed by SQLite against local time (dates are stored in local
+    # time), so only overdue rows come back and nothing is parsed in Python.
+    sql = """
+        SELECT pr.id, pr.patient_id, pr.medication, pr.quantity, pr.slot_id,
+               p.name, p.address,
+               CAST(julianday('now','localtime') - julianday(pr.date_added) AS INT) AS days
+        FROM prescriptions pr
+        JOIN patients p ON p.id = pr.patient_id
+        WHERE %s
+    """ % SQL_OVERDUE_WHERE
+    params = (_overdue_cutoff(min_days_over),)
+    if patient_id is not None:
+        sql += " AND pr.patient_id = ?"
+        params += (patient_id,)
+    rows = db_fetchall(sql, params)
+    return [{
+        "prescription_id": pr_id,
+        "patient_id": pid,
+        "name": name,
+        "address": address,
+        "medication": med,
+        "quantity": qty,
+        "days_overdue": days,
+        "slot_id": slot_id
+    } for pr_id, pid, med, qty, slot_id, name, address, days in rows]
+
+def get_overdue_by_patient(min_days_over=14, limit=-1, offset=0):
+    """Per-patient overdue summary {pid: {name, address, count, oldest, slots}}, grouped in SQL.
+    limit/offset page through patients (limit -1 = all)."""
     rows = db_fetchall("""
-        SELECT pr.id, pr.patient_id, pr.medication, pr.quantity, pr.date_added, pr.slot_id,
-               p.name, p.address
+        SELECT p.id, p.name, p.address, COUNT(*),
+               MAX(CAST(julianday('now','localtime') - julianday(pr.date_added) AS INT)),
+               GROUP_CONCAT(pr.slot_id)
         FROM prescriptions pr
         JOIN patients p ON p.id = pr.patient_id
-    """)
-    now = datetime.now()
-    out = []
-    for pr_id, pid, med, qty, dtxt, slot_id, name, address in rows:
-        dt = parse_any_date(dtxt)
-        if not dt:
-            continue
-        days = (now - dt).days
-        if days >= min_days_over:
-            out.append({
-                "prescription_id": pr_id,
-                "patient_id": pid,
-                "name": name,
-                "address": address,
-                "medication": med,
-                "quantity": qty,
-                "days_overdue": days,
-                "slot_id": slot_id
-            })
-    return out
-
-def aggregate_overdue_by_patient(items):
-    agg = {}
-    for it in items:
-        pid = it["patient_id"]
-        if pid not in agg:
-            agg[pid] = {
-                "name": it["name"], "address": it["address"],
-                "count": 0, "oldest": 0, "slots": set()
-            }
-        agg[pid]["count"] += 1
-        if it["days_overdue"] > agg[pid]["oldest"]:
-            agg[pid]["oldest"] = it["days_overdue"]
-        if it["slot_id"]:
-            agg[pid]["slots"].add(it["slot_id"])
-    return agg
+        WHERE %s
+        GROUP BY p.id
+        ORDER BY MIN(pr.id)
+        LIMIT ? OFFSET ?
+    """ % SQL_OVERDUE_WHERE, (_overdue_cutoff(min_days_over), limit, offset))
+    return {pid: {"name": name, "address": address, "count": count, "oldest": oldest,
+                  "slots": {int(s) for s in slots.split(",")} if slots else set()}
+            for pid, name, address, count, oldest, slots in rows}
+
+def get_overdue_totals(min_days_over=14):
+    """(number of overdue prescriptions, sorted distinct slot ids) across all patients."""
+    count, slots = db_fetchone("""
+        SELECT COUNT(*), GROUP_CONCAT(DISTINCT pr.slot_id)
+        FROM prescriptions pr
+        JOIN patients p ON p.id = pr.patient_id
+        WHERE %s
+    """ % SQL_OVERDUE_WHERE, (_overdue_cutoff(min_days_over),))
+    return count, sorted(int(s) for s in slots.split(",")) if slots else []
 
 # ================================
 # Pharmacy LED System - Part 3
@@ -609,46 +889,58 @@ def confirm_auto_assign_popup(parent, presc_id, slot_ids, shelf_name, refresh_cb
     """
     labels = slot_ids_to_labels(slot_ids)
     short = " & ".join([l.split("-")[1] for l in labels]) if labels else "(unknown)"
-    win = ctk.CTkToplevel(parent); win.title("Confirm Slot")
-    win.geometry("520x180"); win.lift(); win.attributes("-topmost", True)
-    make_topmost(win)
 
-    ctk.CTkLabel(
-        win,
-        text=f"Proposed Shelf {shelf_name}: {short}\n(Full: {', '.join(labels)})",
-        font=ctk.CTkFont(size=17)
-    ).pack(padx=12, pady=12)
+    def build(win):
+        win.title("Confirm Slot")
+        win.geometry("520x180")
+        win._label = ctk.CTkLabel(win, text="", font=app_font(17))
+        win._label.pack(padx=12, pady=12)
+        btnf = ctk.CTkFrame(win); btnf.pack(pady=10)
+        win._accept_btn = ctk.CTkButton(btnf, text="✅ Confirm", width=120)
+        win._accept_btn.pack(side="left", padx=8)
+        win._deny_btn = ctk.CTkButton(btnf, text="✋ Deny / Manual", width=140)
+        win._deny_btn.pack(side="left", padx=8)
+
+    win = pooled_popup(parent, "confirm_assign", build)
+    win._label.configure(text=f"Proposed Shelf {shelf_name}: {short}\n(Full: {', '.join(labels)})")
 
     def accept():
-        # Occupy all proposed slots
-        mark_slots_occupied(slot_ids)
-        # Store only the first id (Option A: no schema change)
-        db_exec("UPDATE prescriptions SET slot_id=? WHERE id=?", (slot_ids[0], presc_id))
-        log_action(f"Auto-assigned prescription id={presc_id} to {', '.join(labels)}")
-        win.destroy()
+        with db_transaction():  # one commit for the slots, the prescription and the log row
+            # Occupy all proposed slots
+            mark_slots_occupied(slot_ids)
+            # Store only the first id (Option A: no schema change)
+            db_exec("UPDATE prescriptions SET slot_id=? WHERE id=?", (slot_ids[0], presc_id))
+            log_action(f"Auto-assigned prescription id={presc_id} to {', '.join(labels)}")
+        hide_popup(win)
         refresh_cb()
         open_led_popup(parent, slot_ids, "yellow", "Guide to New Slot")
 
     def deny():
-        win.destroy()
+        hide_popup(win)
         manual_assign_popup(parent, presc_id, refresh_cb)
 
-    btnf = ctk.CTkFrame(win); btnf.pack(pady=10)
-    ctk.CTkButton(btnf, text="✅ Confirm", width=120, command=accept).pack(side="left", padx=8)
-    ctk.CTkButton(btnf, text="✋ Deny / Manual", width=140, command=deny).pack(side="left", padx=8)
+    win._accept_btn.configure(command=accept)
+    win._deny_btn.configure(command=deny)
 
 
 def manual_assign_popup(parent, presc_id, refresh_cb):
-    m = ctk.CTkToplevel(parent); m.title("Manual Slot Assignment")
-    m.geometry("420x260"); m.lift(); m.attributes("-topmost", True)
-    make_topmost(m)
-
-    ctk.CTkLabel(m, text="Shelf (e.g., F/L/R)", font=ctk.CTkFont(size=17)).grid(row=0, column=0, padx=8, pady=8, sticky="e")
-    s_e = ctk.CTkEntry(m, width=80); s_e.grid(row=0, column=1, padx=8, pady=8)
-    ctk.CTkLabel(m, text="Row (A–Z)", font=ctk.CTkFont(size=17)).grid(row=1, column=0, padx=8, pady=8, sticky="e")
-    r_e = ctk.CTkEntry(m, width=80); r_e.grid(row=1, column=1, padx=8, pady=8)
-    ctk.CTkLabel(m, text="Column (1–N)", font=ctk.CTkFont(size=17)).grid(row=2, column=0, padx=8, pady=8, sticky="e")
-    c_e = ctk.CTkEntry(m, width=100); c_e.grid(row=2, column=1, padx=8, pady=8)
+    def build(m):
+        m.title("Manual Slot Assignment")
+        m.geometry("420x260")
+        ctk.CTkLabel(m, text="Shelf (e.g., F/L/R)", font=app_font(17)).grid(row=0, column=0, padx=8, pady=8, sticky="e")
+        s_e = ctk.CTkEntry(m, width=80); s_e.grid(row=0, column=1, padx=8, pady=8)
+        ctk.CTkLabel(m, text="Row (A–Z)", font=app_font(17)).grid(row=1, column=0, padx=8, pady=8, sticky="e")
+        r_e = ctk.CTkEntry(m, width=80); r_e.grid(row=1, column=1, padx=8, pady=8)
+        ctk.CTkLabel(m, text="Column (1–N)", font=app_font(17)).grid(row=2, column=0, padx=8, pady=8, sticky="e")
+        c_e = ctk.CTkEntry(m, width=100); c_e.grid(row=2, column=1, padx=8, pady=8)
+        m._entries = (s_e, r_e, c_e)
+        m._assign_btn = ctk.CTkButton(m, text="Assign", width=120)
+        m._assign_btn.grid(row=3, column=0, columnspan=2, pady=12)
+
+    m = pooled_popup(parent, "manual_assign", build)
+    s_e, r_e, c_e = m._entries
+    for e in m._entries:
+        e.delete(0, "end")  # a re-shown popup still holds the last slot typed
 
     def assign():
         s = s_e.get().strip().upper()
@@ -677,19 +969,20 @@ def manual_assign_popup(parent, presc_id, refresh_cb):
             if occ2:
                 messagebox.showerror("Error", f"Adjacent slot {slot_id_to_label(slot_id2)} already occupied"); return
 
-            mark_slots_occupied([slot_id, slot_id2])
-            db_exec("UPDATE prescriptions SET slot_id=? WHERE id=?", (slot_id, presc_id))
-            log_action(f"Manually assigned LARGE id={presc_id} to {slot_id_to_label(slot_id)} & {slot_id_to_label(slot_id2)}")
-            m.destroy(); refresh_cb()
-            open_led_popup(parent, [slot_id, slot_id2], "yellow", "Guide to New Slot")
+            slots = [slot_id, slot_id2]
+            msg = f"Manually assigned LARGE id={presc_id} to {slot_id_to_label(slot_id)} & {slot_id_to_label(slot_id2)}"
         else:
-            mark_slots_occupied([slot_id])
+            slots = [slot_id]
+            msg = f"Manually assigned id={presc_id} to {slot_id_to_label(slot_id)}"
+
+        with db_transaction():
+            mark_slots_occupied(slots)
             db_exec("UPDATE prescriptions SET slot_id=? WHERE id=?", (slot_id, presc_id))
-            log_action(f"Manually assigned id={presc_id} to {slot_id_to_label(slot_id)}")
-            m.destroy(); refresh_cb()
-            open_led_popup(parent, [slot_id], "yellow", "Guide to New Slot")
+            log_action(msg)
+        hide_popup(m); refresh_cb()
+        open_led_popup(parent, slots, "yellow", "Guide to New Slot")
 
-    ctk.CTkButton(m, text="Assign", width=120, command=assign).grid(row=3, column=0, columnspan=2, pady=12)
+    m._assign_btn.configure(command=assign)
 
 def try_family_bin_popup(parent, patient_id, address, presc_id, on_done=None, on_no_family=None):
     """
@@ -704,14 +997,13 @@ def try_family_bin_popup(parent, patient_id, address, presc_id, on_done=None, on
         return
 
     win = ctk.CTkToplevel(parent); win.title("Family Match")
-    win.geometry("560x260"); win.lift(); win.attributes("-topmost", True)
+    win.geometry("560x260")
     make_topmost(win)
-    ctk.CTkLabel(win, text="Same address found. Select a bin to share:", font=ctk.CTkFont(size=17)).pack(padx=12, pady=8)
+    ctk.CTkLabel(win, text="Same address found. Select a bin to share:", font=app_font(17)).pack(padx=12, pady=8)
 
     listf = ctk.CTkFrame(win); listf.pack(fill="both", expand=True, padx=12, pady=8)
-    tv = ttk.Treeview(listf, columns=("Name","Location"), show="headings", height=6)
-    tv.heading("Name", text="Name"); tv.heading("Location", text="Location")
-    tv.column("Name", width=260, anchor="w"); tv.column("Location", width=200, anchor="w")
+    tv = ttk.Treeview(listf, columns=TREE_COLS["family"], show="headings", height=6)
+    configure_tree(tv, "family")
     tv.pack(fill="both", expand=True)
 
     for (pid, name, sid) in choices:
@@ -723,8 +1015,10 @@ def try_family_bin_popup(parent, patient_id, address, presc_id, on_done=None, on
             messagebox.showinfo("Select", "Choose a bin to share."); return
         sid = int(sel[0])
         # NOTE: We DO NOT change slot occupancy here; sharing an already-occupied bin is expected.
-        db_exec("UPDATE prescriptions SET slot_id=? WHERE id=?", (sid, presc_id))
-        log_action(f"Binned prescription id={presc_id} with family at {slot_id_to_label(sid)}")
+        with db_transaction():
+            db_exec("UPDATE prescriptions SET slot_id=? WHERE id=?", (sid, presc_id))
+            log_action(f"Binned prescription id={presc_id} with family at {slot_id_to_label(sid)}")
+        _mark_occupancy_dirty()
         win.destroy()
         if on_done: on_done()
         open_led_popup(parent, [sid], "purple", "Family Bin Location")
@@ -734,14 +1028,8 @@ def try_family_bin_popup(parent, patient_id, address, presc_id, on_done=None, on
     ctk.CTkButton(btnf, text="Skip", width=120, command=lambda: (win.destroy(), on_no_family and on_no_family())).pack(side="left", padx=8)
 
 def clear_all_prescriptions_with_led(parent, patient_id, on_done_refresh):
-    # collect all slots for this patient (expand large pair)
-    rows = db_fetchall("SELECT id FROM prescriptions WHERE patient_id=?", (patient_id,))
-    all_presc_ids = [r[0] for r in rows]
-    slots = []
-    for pr_id in all_presc_ids:
-        slots.extend([s for s in expand_slots_for_large_display_or_freeing(pr_id) if s])
-    # de-dup
-    slots = sorted(list({s for s in slots}))
+    # collect all slots for this patient (expand large pair), de-duplicated in SQL
+    slots = patient_slots_for_freeing(patient_id)
 
     if not slots:
         if messagebox.askyesno("Confirm", "No slots assigned. Clear all prescriptions anyway?"):
@@ -754,19 +1042,20 @@ def clear_all_prescriptions_with_led(parent, patient_id, on_done_refresh):
     key = start_blink(slots, "red")
     lbls = ", ".join(slot_ids_to_labels(slots))
     win = ctk.CTkToplevel(parent); win.title("Confirm Clear All")
-    win.geometry("640x240"); win.lift(); win.attributes("-topmost", True)
+    win.geometry("640x240")
     make_topmost(win)
     ctk.CTkLabel(
         win,
         text=f"Please confirm all indicated bins are EMPTY:\n{lbls}",
-        font=ctk.CTkFont(size=17)
+        font=app_font(17)
     ).pack(padx=12, pady=12)
 
     def confirm():
         stop_blink(key)
-        mark_slots_free(slots)
-        db_exec("DELETE FROM prescriptions WHERE patient_id=?", (patient_id,))
-        log_action(f"Cleared all prescriptions for patient_id={patient_id} (verified empty bins)")
+        with db_transaction():
+            mark_slots_free(slots)
+            db_exec("DELETE FROM prescriptions WHERE patient_id=?", (patient_id,))
+            log_action(f"Cleared all prescriptions for patient_id={patient_id} (verified empty bins)")
         win.destroy()
         on_done_refresh()
 
@@ -785,9 +1074,7 @@ def auto_reassign_in_section(parent, presc_id, refresh_cb):
     if not row:
         return
     pid, basket = row
-    # Repair occupancy before reassign
-    repair_slot_occupancy()
-    res = auto_assign_for_patient(pid, basket or "small")
+    res = auto_assign_for_patient(pid, basket or "small")  # repairs occupancy itself
     if not res:
         messagebox.showwarning("No Slot", "No available slot found (including overflow).")
         return
@@ -816,6 +1103,53 @@ def style_treeview():
                     font=("Segoe UI Semibold", 20))
     style.map("Treeview", background=[("selected", "#cfe8ff")])
 
+@functools.lru_cache(maxsize=None)
+def app_font(size, weight="normal"):
+    """Shared CTkFont per (size, weight), so widgets don't each allocate a Tk font. Needs the root window."""
+    return ctk.CTkFont(size=size, weight=weight)
+
+PAGE_SIZE = 200  # rows fetched per page by lazily paged tables
+ROW_TAGS = ("even", "odd")  # zebra striping, indexed by row number & 1
+
+# (heading, width, anchor) per column for every Treeview the app builds
+TREE_COL_SPECS = {
+    "patients": [("Name",260,"w"), ("Address",260,"w"), ("Date Added",260,"w"), ("Locations",520,"w")],
+    "rx":       [("Medication",230,"w"), ("Quantity",230,"w"), ("Date Added",230,"w"), ("Basket",230,"w"), ("Location",300,"w")],
+    "family":   [("Name",260,"w"), ("Location",200,"w")],
+    "shelves":  [("Name",160,"w"), ("Rows",120,"w"), ("Cols",120,"w"), ("Used%",120,"w")],
+    "overdue":  [("Patient",220,"w"), ("Address",220,"w"), ("# Overdue",220,"w"), ("Oldest (days)",220,"w"), ("Locations",380,"w")],
+    "overdue_detail": [("Medication",220,"w"), ("Quantity",220,"w"), ("Days Overdue",220,"w"), ("Location",260,"w")],
+    "usage":    [("Shelf",150,"w"), ("Used",150,"w"), ("Total",150,"w"), ("Used %",150,"w")],
+    "actions":  [("Time",160,"w"), ("Actor",160,"w"), ("Action",760,"w")],
+}
+TREE_COLS = {k: tuple(c[0] for c in spec) for k, spec in TREE_COL_SPECS.items()}
+
+def configure_tree(tv, key):
+    """Apply the headings/widths from TREE_COL_SPECS[key] to a Treeview."""
+    for name, width, anchor in TREE_COL_SPECS[key]:
+        tv.heading(name, text=name)
+        tv.column(name, width=width, anchor=anchor)
+
+def bind_lazy_paging(tree, scrollbar, load_more):
+    """Drive the scrollbar from the tree and call load_more() once the view nears the bottom."""
+    pending = [False]
+    def run():
+        pending[0] = False
+        load_more()
+    def on_scroll(first, last):
+        scrollbar.set(first, last)
+        if float(last) >= 0.95 and not pending[0]:
+            pending[0] = True
+            tree.after_idle(run)
+    tree.configure(yscrollcommand=on_scroll)
+
+def build_patient_page(sql, params, offset, limit=PAGE_SIZE):
+    """Run one page of the patient-list query and build its (iid, values, tag) tree rows."""
+    rows = db_fetchall(sql, tuple(params) + (limit, offset))
+    locations = format_patient_locations({r[0]: r[1] for r in rows})
+    return [(str(pid), (name, addr or "", display_date(created), ", ".join(locations[pid])), ROW_TAGS[i & 1])
+            for i, (pid, name, addr, created) in enumerate(rows, offset)]
+
 class App(ctk.CTk):
     def __init__(self):
         super().__init__()
@@ -827,16 +1161,27 @@ class App(ctk.CTk):
         self.minsize(1280, 780)
 
         style_treeview()
+        start_blink_scheduler(self)
+        self._patient_pages = {}       # (sql, params, offset, limit) -> built tree rows
+        self._patient_pages_gen = None  # _db_generation the cached pages belong to
+        self._patient_loading = False   # a page is being built on the DB worker
+        self._db_executor = ThreadPoolExecutor(max_workers=1)
+        self._refresh_pending = None    # after() id of a debounced patient-list refresh
+        self._patient_shown = {}        # iid -> (values, tag) currently in the patient tree
+        self._patient_limit = PAGE_SIZE  # rows the next patient-list load fetches
+        self._patient_query = None      # (sql, params) of the patient list being shown
+        self._last_refresh_key = None   # (search, sort, _db_generation) the tree currently shows
         # Ensure DB slot occupancy matches prescriptions on startup
         try:
             repair_slot_occupancy()
         except Exception as e:
             print("Occupancy repair skipped:", e)
+        load_slot_labels()
         # ---------- Top bar ----------
         topbar = ctk.CTkFrame(self, corner_radius=0)
         topbar.pack(side="top", fill="x")
         ctk.CTkLabel(topbar, text="💊 Pharmacy LED System",
-                     font=ctk.CTkFont(size=20, weight="bold")).pack(side="left", padx=12, pady=8)
+                     font=app_font(20, "bold")).pack(side="left", padx=12, pady=8)
         self.theme_mode = ctk.StringVar(value="Dark")
         def toggle_theme():
             mode = "Light" if self.theme_mode.get() == "Dark" else "Dark"
@@ -847,7 +1192,7 @@ class App(ctk.CTk):
         # ---------- Right sidebar ----------
         sidebar = ctk.CTkFrame(self, width=240, corner_radius=0)
         sidebar.pack(side="right", fill="y")
-        ctk.CTkLabel(sidebar, text="Tools", font=ctk.CTkFont(size=18, weight="bold")).pack(pady=(12, 8))
+        ctk.CTkLabel(sidebar, text="Tools", font=app_font(18, "bold")).pack(pady=(12, 8))
         ctk.CTkButton(sidebar, text="📚 Shelf Assignment", command=self.open_shelf_assignment).pack(padx=10, pady=6, fill="x")
         ctk.CTkButton(sidebar, text="⏰ Overdue Meds", command=self.open_overdue_tab).pack(padx=10, pady=6, fill="x")
         ctk.CTkButton(sidebar, text="📊 Dashboard", command=self.open_dashboard_tab).pack(padx=10, pady=6, fill="x")
@@ -856,21 +1201,23 @@ class App(ctk.CTk):
         # ---------- Patients header + controls ----------
         header = ctk.CTkFrame(self, fg_color="#0b5cab")
         header.pack(fill="x", padx=0, pady=(0,6))
-        ctk.CTkLabel(header, text="Patients", font=ctk.CTkFont(size=20, weight="bold")).pack(anchor="w", padx=12, pady=8)
+        ctk.CTkLabel(header, text="Patients", font=app_font(20, "bold")).pack(anchor="w", padx=12, pady=8)
 
         controls = ctk.CTkFrame(self)
         controls.pack(fill="x", padx=10, pady=(0,8))
-        ctk.CTkLabel(controls, text="Search:", font=ctk.CTkFont(size=17)).pack(side="left", padx=(8,6))
+        ctk.CTkLabel(controls, text="Search:", font=app_font(17)).pack(side="left", padx=(8,6))
         self.search_var = ctk.StringVar()
         search_entry = ctk.CTkEntry(controls, textvariable=self.search_var, width=260)
         search_entry.pack(side="left", padx=(0,10))
         search_entry.bind("<Return>", lambda e: self.refresh_patient_table())
+        search_entry.bind("<KeyRelease>", lambda e: e.keysym != "Return" and self.schedule_refresh())
 
         # Sorting/filtering dropdown
-        ctk.CTkLabel(controls, text="Sort:", font=ctk.CTkFont(size=17)).pack(side="left", padx=(8,6))
+        ctk.CTkLabel(controls, text="Sort:", font=app_font(17)).pack(side="left", padx=(8,6))
         self.sort_var = ctk.StringVar(value="Name A→Z (Last Initial)")
         sort_options = ["Name A→Z (Last Initial)", "Recently Added", "Address A→Z"]
-        sort_menu = ctk.CTkComboBox(controls, values=sort_options, variable=self.sort_var, width=240)
+        sort_menu = ctk.CTkComboBox(controls, values=sort_options, variable=self.sort_var, width=240,
+                                    command=lambda _choice: self.schedule_refresh())
         sort_menu.pack(side="left", padx=6)
 
         ctk.CTkButton(controls, text="🔎 Apply", command=self.refresh_patient_table).pack(side="left", padx=6)
@@ -884,15 +1231,13 @@ class App(ctk.CTk):
         table_frame = ctk.CTkFrame(self)
         table_frame.pack(fill="both", expand=True, padx=10, pady=(0,10))
 
-        self.tree = ttk.Treeview(table_frame, columns=("Name","Address","Date Added","Locations"),
+        self.tree = ttk.Treeview(table_frame, columns=TREE_COLS["patients"],
                                  show="headings", selectmode="browse")
-        for c in ("Name","Address","Date Added","Locations"):
-            self.tree.heading(c, text=c)
-            self.tree.column(c, width=260 if c!="Locations" else 520, anchor="w")
+        configure_tree(self.tree, "patients")
         self.tree.pack(fill="both", expand=True, side="left")
         sb = ttk.Scrollbar(table_frame, orient="vertical", command=self.tree.yview)
         sb.pack(side="right", fill="y")
-        self.tree.configure(yscroll=sb.set)
+        bind_lazy_paging(self.tree, sb, self.load_more_patients)
         self.tree.tag_configure("odd", background="#f5f9ff")
         self.tree.tag_configure("even", background="#ffffff")
         self.tree.bind("<Double-1>", self.on_patient_double)
@@ -900,71 +1245,153 @@ class App(ctk.CTk):
         self.refresh_patient_table()
 
     # ----- Patients main -----
+    def schedule_refresh(self, delay=150):
+        """Refresh the patient list once typing pauses for `delay` ms."""
+        if self._refresh_pending:
+            self.after_cancel(self._refresh_pending)
+        self._refresh_pending = self.after(delay, self.refresh_patient_table)
+
+    def request_refresh(self):
+        """Refresh the patient list once the current event has been handled.
+        Back-to-back requests (save, then auto-assign, then popup close) collapse into one."""
+        if not self._refresh_pending:
+            self._refresh_pending = self.after_idle(self.refresh_patient_table)
+
     def refresh_patient_table(self):
-        for r in self.tree.get_children():
-            self.tree.delete(r)
+        if self._refresh_pending:
+            self.after_cancel(self._refresh_pending)
+            self._refresh_pending = None
+        # rows already in the tree stay until the first page arrives, then only the difference is applied
 
         q = (self.search_var.get() or "").strip()
+        key = (q, self.sort_var.get(), _db_generation)
+        if key == self._last_refresh_key:
+            return  # same search and sort over unchanged data: the tree (and its loaded pages) is current
+        self._last_refresh_key = key
         base_sql = """
             SELECT p.id, p.name, p.address, p.created_at
             FROM patients p
         """
         params = []
         where = []
-        if q:
-            # match on name or address or medication
-            base_sql += " LEFT JOIN prescriptions pr ON pr.patient_id = p.id "
-            where.append("(p.name LIKE ? OR p.address LIKE ? OR pr.medication LIKE ?)")
+        match = fts_prefix_query(q) if q and _patient_search else ""
+        if match:
+            # word-prefix match on name, address or any medication
+            base_sql += " JOIN patient_search ps ON ps.rowid = p.id "
+            where.append("patient_search MATCH ?")
+            params.append(match)
+        elif q:
+            # match on name or address or medication (subquery keeps one row per patient)
+            where.append("(p.name LIKE ? OR p.address LIKE ? OR p.id IN "
+                         "(SELECT patient_id FROM prescriptions WHERE medication LIKE ?))")
             params.extend([f"%{q}%", f"%{q}%", f"%{q}%"])
 
         if where:
             base_sql += " WHERE " + " AND ".join(where)
 
-        # Sorting
+        # Sorting (p.id tiebreak keeps pages stable)
         sort = self.sort_var.get()
         if sort == "Recently Added":
-            base_sql += " ORDER BY p.created_at DESC"
+            base_sql += " ORDER BY p.created_at DESC, p.id DESC"
         elif sort == "Address A→Z":
-            base_sql += " ORDER BY p.address COLLATE NOCASE ASC, p.name COLLATE NOCASE ASC"
+            base_sql += " ORDER BY p.address COLLATE NOCASE ASC, p.name COLLATE NOCASE ASC, p.id"
         else:
             # Name A→Z by last initial
-            base_sql += " ORDER BY p.name COLLATE NOCASE ASC"
-
-        rows = db_fetchall(base_sql, tuple(params))
-
-        for i, (pid, name, addr, created) in enumerate(rows):
-            date_disp = ""
-            if created:
-                for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d"):
-                    try:
-                        date_disp = datetime.strptime(created, fmt).strftime("%m/%d/%Y")
-                        break
-                    except:
-                        pass
-            # all distinct locations
-            slot_rows = db_fetchall(
-                "SELECT DISTINCT slot_id FROM prescriptions WHERE patient_id=? AND slot_id IS NOT NULL", (pid,)
-            )
-            locs = []
-            for s in slot_rows:
-                sid = s[0]
-                if sid:
-                    locs.append(format_slot_label_for_patient(pid, sid))
-            tag = "odd" if i % 2 else "even"
-            self.tree.insert("", "end", iid=str(pid),
-                             values=(name, addr or "", date_disp, ", ".join([l for l in locs if l])),
-                             tags=(tag,))
+            base_sql += " ORDER BY p.name COLLATE NOCASE ASC, p.id"
+
+        query = (base_sql + " LIMIT ? OFFSET ?", params)
+        # Same query (data changed): re-fetch every row already loaded so the diff
+        # covers them all and rows past the first page keep their place and selection.
+        loaded = len(self._patient_shown) if query == self._patient_query else 0
+        self._patient_limit = max(PAGE_SIZE, -(-loaded // PAGE_SIZE) * PAGE_SIZE)
+        self._patient_query = query
+        self._patient_offset = 0
+        self.load_more_patients()
+
+    def load_more_patients(self):
+        """Append the next PAGE_SIZE rows of the current patient query to the tree."""
+        if self._patient_offset is None or self._patient_loading:
+            return  # everything already loaded, or a page is on its way
+        sql, params = self._patient_query
+        if self._patient_pages_gen != _db_generation or len(self._patient_pages) > 64:
+            self._patient_pages = {}
+            self._patient_pages_gen = _db_generation
+        key = (sql, tuple(params), self._patient_offset, self._patient_limit)
+        items = self._patient_pages.get(key)
+        if items is not None:
+            self._append_patient_page(items)
+            return
+        # query + formatting run on the DB worker; Tk is only touched from _poll_patient_page
+        self._patient_loading = True
+        fut = self._db_executor.submit(build_patient_page, *key)
+        self._poll_patient_page(fut, key, _db_generation)
+
+    def _poll_patient_page(self, fut, key, gen):
+        if not fut.done():
+            self.after(15, self._poll_patient_page, fut, key, gen)
+            return
+        self._patient_loading = False
+        try:
+            items = fut.result()
+        except Exception as e:
+            print("Patient list load failed:", e)
+            self._last_refresh_key = None  # let the next refresh retry
+            return
+        sql, params = self._patient_query
+        if gen != _db_generation or key != (sql, tuple(params), self._patient_offset, self._patient_limit):
+            self.load_more_patients()  # data or query changed meanwhile; load what the table wants now
+            return
+        self._patient_pages[key] = items
+        self._append_patient_page(items)
+
+    def _append_patient_page(self, items):
+        offset = self._patient_offset
+        self._patient_offset = offset + len(items) if len(items) == self._patient_limit else None
+        self._patient_limit = PAGE_SIZE
+
+        # insert with the scrollbar detached so it is updated once, not per row
+        ysc = self.tree.cget("yscrollcommand")
+        self.tree.configure(yscrollcommand="")
+        if offset == 0:
+            self._replace_patient_rows(items)
+        else:
+            for iid, values, tag in items:
+                self.tree.insert("", "end", iid=iid, values=values, tags=(tag,))
+                self._patient_shown[iid] = (values, tag)
+        self.tree.configure(yscrollcommand=ysc)
+
+    def _replace_patient_rows(self, items):
+        """Make the tree show exactly `items`, touching only rows that were added, removed, changed or moved."""
+        shown = self._patient_shown
+        keep = {iid for iid, _v, _t in items}
+        gone = [iid for iid in shown if iid not in keep]
+        if gone:
+            self.tree.delete(*gone)
+            for iid in gone:
+                del shown[iid]
+        # existing rows only need moving if the new order differs (e.g. sort changed)
+        in_order = list(self.tree.get_children()) == [iid for iid, _v, _t in items if iid in shown]
+        for i, (iid, values, tag) in enumerate(items):
+            old = shown.get(iid)
+            if old is None:
+                self.tree.insert("", i, iid=iid, values=values, tags=(tag,))
+            else:
+                if old != (values, tag):
+                    self.tree.item(iid, values=values, tags=(tag,))
+                if not in_order:
+                    self.tree.move(iid, "", i)
+            shown[iid] = (values, tag)
 
     def add_patient_popup(self):
         p = ctk.CTkToplevel(self); p.title("Add Patient")
-        p.geometry("560x240"); p.lift(); p.attributes("-topmost", True)
+        p.geometry("560x240")
         make_topmost(p)
         head = ctk.CTkFrame(p, fg_color="#0b5cab"); head.pack(fill="x")
-        ctk.CTkLabel(head, text="Add Patient", font=ctk.CTkFont(size=20, weight="bold")).pack(anchor="w", padx=12, pady=8)
+        ctk.CTkLabel(head, text="Add Patient", font=app_font(20, "bold")).pack(anchor="w", padx=12, pady=8)
         body = ctk.CTkFrame(p); body.pack(fill="both", expand=True, padx=12, pady=10)
-        ctk.CTkLabel(body, text="Name", font=ctk.CTkFont(size=17)).grid(row=0, column=0, sticky="e", padx=8, pady=8)
+        ctk.CTkLabel(body, text="Name", font=app_font(17)).grid(row=0, column=0, sticky="e", padx=8, pady=8)
         name_e = ctk.CTkEntry(body, width=320); name_e.grid(row=0, column=1, padx=8, pady=8)
-        ctk.CTkLabel(body, text="Address", font=ctk.CTkFont(size=17)).grid(row=1, column=0, sticky="e", padx=8, pady=8)
+        ctk.CTkLabel(body, text="Address", font=app_font(17)).grid(row=1, column=0, sticky="e", padx=8, pady=8)
         addr_e = ctk.CTkEntry(body, width=320); addr_e.grid(row=1, column=1, padx=8, pady=8)
         def save():
             nm = name_e.get().strip()
@@ -973,7 +1400,7 @@ class App(ctk.CTk):
             db_exec("INSERT INTO patients(name,address,created_at) VALUES(?,?,?)",
                     (nm, addr_e.get().strip(), datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
             log_action(f"Added patient: {nm}")
-            p.destroy(); self.refresh_patient_table()
+            p.destroy(); self.request_refresh()
         ctk.CTkButton(body, text="Save", width=120, fg_color="#2F8B2F", hover_color="#277327",
                       command=save).grid(row=2, column=0, columnspan=2, pady=10)
 
@@ -982,17 +1409,14 @@ class App(ctk.CTk):
         if not sel:
             return
         pid = int(sel[0])
-        name = db_fetchone("SELECT name FROM patients WHERE id=?", (pid,))[0]
+        name = self._patient_shown[sel[0]][0][0]  # the selected row already holds the name
         if not messagebox.askyesno("Confirm", f"Delete {name} and ALL prescriptions?"):
             return
-        rows = db_fetchall("SELECT slot_id FROM prescriptions WHERE patient_id=?", (pid,))
-        sids = [r[0] for r in rows if r and r[0]]
-        if sids:
-            mark_slots_free(sids)
-        db_exec("DELETE FROM prescriptions WHERE patient_id=?", (pid,))
-        db_exec("DELETE FROM patients WHERE id=?", (pid,))
+        with db_transaction() as cur:
+            mark_slots_free(patient_slots_for_freeing(pid))  # large-basket partners too
+            cur.execute("DELETE FROM patients WHERE id=?", (pid,))  # trg_patients_delete drops the prescriptions
         log_action(f"Deleted patient: {name}")
-        self.refresh_patient_table()
+        self.request_refresh()
 
     def on_patient_double(self, _event):
         sel = self.tree.selection()
@@ -1012,18 +1436,18 @@ class App(ctk.CTk):
         row = db_fetchone("SELECT name,address FROM patients WHERE id=?", (pid,))
         pname, paddr = (row[0], row[1] or "") if row else ("","")
         win = ctk.CTkToplevel(self); win.title(f"Patient — {pname}")
-        win.geometry("1200x820"); win.lift(); win.attributes("-topmost", True)
+        win.geometry("1200x820")
         make_topmost(win)
 
         # Header
         head = ctk.CTkFrame(win, fg_color="#107c10"); head.pack(fill="x")
-        ctk.CTkLabel(head, text=f"Patient — {pname}", font=ctk.CTkFont(size=20, weight="bold")).pack(anchor="w", padx=12, pady=8)
+        ctk.CTkLabel(head, text=f"Patient — {pname}", font=app_font(20, "bold")).pack(anchor="w", padx=12, pady=8)
 
         # Patient info line
         info = ctk.CTkFrame(win); info.pack(fill="x", padx=12, pady=(10,6))
-        ctk.CTkLabel(info, text="Name", font=ctk.CTkFont(size=17)).grid(row=0, column=0, sticky="e", padx=6, pady=6)
+        ctk.CTkLabel(info, text="Name", font=app_font(17)).grid(row=0, column=0, sticky="e", padx=6, pady=6)
         name_e = ctk.CTkEntry(info, width=360); name_e.grid(row=0, column=1, padx=6, pady=6); name_e.insert(0, pname)
-        ctk.CTkLabel(info, text="Address", font=ctk.CTkFont(size=17)).grid(row=0, column=2, sticky="e", padx=6, pady=6)
+        ctk.CTkLabel(info, text="Address", font=app_font(17)).grid(row=0, column=2, sticky="e", padx=6, pady=6)
         addr_e = ctk.CTkEntry(info, width=360); addr_e.grid(row=0, column=3, padx=6, pady=6); addr_e.insert(0, paddr)
 
         ctk.CTkButton(
@@ -1038,7 +1462,7 @@ class App(ctk.CTk):
 
         ctk.CTkButton(
             info, text="🗑️ Clear All Prescriptions", fg_color="#D83B01", hover_color="#B32F00",
-            command=lambda: clear_all_prescriptions_with_led(win, pid, self.refresh_patient_table)
+            command=lambda: clear_all_prescriptions_with_led(win, pid, self.request_refresh)
         ).grid(row=0, column=6, padx=6)
 
         # Prescriptions table
@@ -1104,7 +1528,7 @@ class App(ctk.CTk):
                 db_exec("DELETE FROM prescriptions WHERE id=?", (prid,))
                 log_action(f"Deleted prescription '{med}' for patient_id={pid}")
             populate_rx()
-            self.refresh_patient_table()
+            self.request_refresh()
 
         def on_key(e):
             if e.keysym in ("Delete","BackSpace"):
@@ -1113,11 +1537,11 @@ class App(ctk.CTk):
 
         # Add prescription row
         addf = ctk.CTkFrame(win); addf.pack(fill="x", padx=12, pady=(4,12))
-        ctk.CTkLabel(addf, text="Medication", font=ctk.CTkFont(size=17)).grid(row=0, column=0, sticky="e", padx=6)
+        ctk.CTkLabel(addf, text="Medication", font=app_font(17)).grid(row=0, column=0, sticky="e", padx=6)
         med_e = ctk.CTkEntry(addf, width=220); med_e.grid(row=0, column=1, padx=6)
-        ctk.CTkLabel(addf, text="Quantity", font=ctk.CTkFont(size=17)).grid(row=0, column=2, sticky="e", padx=6)
+        ctk.CTkLabel(addf, text="Quantity", font=app_font(17)).grid(row=0, column=2, sticky="e", padx=6)
         qty_e = ctk.CTkEntry(addf, width=100); qty_e.grid(row=0, column=3, padx=6)
-        ctk.CTkLabel(addf, text="Basket", font=ctk.CTkFont(size=17)).grid(row=0, column=4, sticky="e", padx=6)
+        ctk.CTkLabel(addf, text="Basket", font=app_font(17)).grid(row=0, column=4, sticky="e", padx=6)
         basket_cb = ctk.CTkComboBox(addf, values=["small","large"], width=120)
         basket_cb.set("small"); basket_cb.grid(row=0, column=5, padx=6)
 
@@ -1138,7 +1562,7 @@ class App(ctk.CTk):
         db_exec("UPDATE patients SET name=?,address=? WHERE id=?", (name, addr, pid))
         log_action(f"Updated patient: {name}")
         popup.destroy()
-        self.refresh_patient_table()
+        self.request_refresh()
 
 
     def _light_up_patient(self, pid, parent):
@@ -1169,13 +1593,13 @@ class App(ctk.CTk):
             res = auto_assign_for_patient(pid, basket)
             if not res:
                 messagebox.showwarning("No Slot","No automatic slot available; please assign manually.")
-                return manual_assign_popup(parent, pres_id, lambda: (refresh_cb(), self.refresh_patient_table()))
+                return manual_assign_popup(parent, pres_id, lambda: (refresh_cb(), self.request_refresh()))
             slot_ids, shelf = res
-            confirm_auto_assign_popup(parent, pres_id, slot_ids, shelf, lambda: (refresh_cb(), self.refresh_patient_table()))
+            confirm_auto_assign_popup(parent, pres_id, slot_ids, shelf, lambda: (refresh_cb(), self.request_refresh()))
 
         try_family_bin_popup(
             parent, pid, address, pres_id,
-            on_done=lambda: (refresh_cb(), self.refresh_patient_table()),
+            on_done=lambda: (refresh_cb(), self.request_refresh()),
             on_no_family=after_no_family
         )
 
@@ -1185,11 +1609,11 @@ class App(ctk.CTk):
     # ----- Edit Prescription -----
     def _edit_prescription_popup(self, patient_id, pres_id, refresh_cb):
         e = ctk.CTkToplevel(self); e.title("Edit Prescription")
-        e.geometry("680x560"); e.lift(); e.attributes("-topmost", True)
+        e.geometry("680x560")
         make_topmost(e)
 
         head = ctk.CTkFrame(e, fg_color="#0b5cab"); head.pack(fill="x")
-        ctk.CTkLabel(head, text="Edit Prescription", font=ctk.CTkFont(size=20, weight="bold")).pack(anchor="w", padx=12, pady=8)
+        ctk.CTkLabel(head, text="Edit Prescription", font=app_font(20, "bold")).pack(anchor="w", padx=12, pady=8)
 
         row = db_fetchone(
             """SELECT medication,quantity,date_added,basket_size,slot_id
@@ -1201,13 +1625,13 @@ class App(ctk.CTk):
         med, qty, dt, basket, slot_id = row
 
         body = ctk.CTkFrame(e); body.pack(fill="both", expand=True, padx=12, pady=10)
-        ctk.CTkLabel(body, text="Medication", font=ctk.CTkFont(size=17)).grid(row=0, column=0, sticky="e", padx=6, pady=6)
+        ctk.CTkLabel(body, text="Medication", font=app_font(17)).grid(row=0, column=0, sticky="e", padx=6, pady=6)
         med_e = ctk.CTkEntry(body, width=320); med_e.grid(row=0, column=1, padx=6, pady=6); med_e.insert(0, med)
 
-        ctk.CTkLabel(body, text="Quantity", font=ctk.CTkFont(size=17)).grid(row=1, column=0, sticky="e", padx=6, pady=6)
+        ctk.CTkLabel(body, text="Quantity", font=app_font(17)).grid(row=1, column=0, sticky="e", padx=6, pady=6)
         qty_e = ctk.CTkEntry(body, width=160); qty_e.grid(row=1, column=1, padx=6, pady=6); qty_e.insert(0, str(qty) if qty is not None else "")
 
-        ctk.CTkLabel(body, text="Date (MM/DD/YYYY)", font=ctk.CTkFont(size=17)).grid(row=2, column=0, sticky="e", padx=6, pady=6)
+        ctk.CTkLabel(body, text="Date (MM/DD/YYYY)", font=app_font(17)).grid(row=2, column=0, sticky="e", padx=6, pady=6)
         date_e = ctk.CTkEntry(body, width=180); date_e.grid(row=2, column=1, padx=6, pady=6)
         if dt:
             for fmt in ("%Y-%m-%d %H:%M:%S","%Y-%m-%d"):
@@ -1217,11 +1641,11 @@ class App(ctk.CTk):
                 except:
                     pass
 
-        ctk.CTkLabel(body, text="Basket", font=ctk.CTkFont(size=17)).grid(row=3, column=0, sticky="e", padx=6, pady=6)
+        ctk.CTkLabel(body, text="Basket", font=app_font(17)).grid(row=3, column=0, sticky="e", padx=6, pady=6)
         b_cb = ctk.CTkComboBox(body, values=["small","large"], width=140)
         b_cb.set(basket if basket in ("small","large") else "small"); b_cb.grid(row=3, column=1, padx=6, pady=6)
 
-        ctk.CTkLabel(body, text="LED Location (F-A61 or id)", font=ctk.CTkFont(size=17)).grid(row=4, column=0, sticky="e", padx=6, pady=6)
+        ctk.CTkLabel(body, text="LED Location (F-A61 or id)", font=app_font(17)).grid(row=4, column=0, sticky="e", padx=6, pady=6)
         loc_e = ctk.CTkEntry(body, width=220); loc_e.grid(row=4, column=1, padx=6, pady=6)
         loc_e.insert(0, slot_id_to_label(slot_id) if slot_id else "")
 
@@ -1258,11 +1682,11 @@ class App(ctk.CTk):
                 (new_med, int(new_qty) if new_qty.isdigit() else new_qty, d, new_b, pres_id)
             )
             log_action(f"Edited prescription id={pres_id} (med='{new_med}', qty='{new_qty}', basket='{new_b}')")
-            e.destroy(); refresh_cb(); self.refresh_patient_table()
+            e.destroy(); refresh_cb(); self.request_refresh()
 
         def auto_assign_here():
             # Always attempt to consolidate into earliest free slot in correct section
-            auto_reassign_in_section(self, pres_id, lambda: (refresh_cb(), self.refresh_patient_table()))
+            auto_reassign_in_section(self, pres_id, lambda: (refresh_cb(), self.request_refresh()))
 
         btnf = ctk.CTkFrame(body); btnf.grid(row=5, column=0, columnspan=2, pady=12)
         ctk.CTkButton(btnf, text="💾 Save Changes", width=150, fg_color="#0B5CAB", hover_color="#084b8a",
@@ -1276,11 +1700,11 @@ class App(ctk.CTk):
     # ---------- Shelf Assignment ----------
     def open_shelf_assignment(self):
         win = ctk.CTkToplevel(self); win.title("Shelf Assignment")
-        win.geometry("1200x860"); win.lift(); win.attributes("-topmost", True)
+        win.geometry("1200x860")
         make_topmost(win)
 
         head = ctk.CTkFrame(win, fg_color="#0b5cab"); head.pack(fill="x")
-        ctk.CTkLabel(head, text="Shelf Assignment", font=ctk.CTkFont(size=20, weight="bold")).pack(anchor="w", padx=12, pady=8)
+        ctk.CTkLabel(head, text="Shelf Assignment", font=app_font(20, "bold")).pack(anchor="w", padx=12, pady=8)
 
         container = ctk.CTkFrame(win); container.pack(fill="both", expand=True, padx=10, pady=10)
         container.grid_columnconfigure(0, weight=1)
@@ -1290,7 +1714,7 @@ class App(ctk.CTk):
         left = ctk.CTkFrame(container)
         left.grid(row=0, column=0, sticky="nsew", padx=(0,5))
 
-        ctk.CTkLabel(left, text="Letter Sections (Bounds like A1..D20)", font=ctk.CTkFont(size=17, weight="bold")).pack(anchor="w", padx=10, pady=6)
+        ctk.CTkLabel(left, text="Letter Sections (Bounds like A1..D20)", font=app_font(17, "bold")).pack(anchor="w", padx=10, pady=6)
 
         letters_frame = ctk.CTkFrame(left)
         letters_frame.pack(fill="both", expand=True, padx=6, pady=6)
@@ -1310,7 +1734,7 @@ class App(ctk.CTk):
         # table header
         hdr = ctk.CTkFrame(inner); hdr.grid(row=0, column=0, sticky="ew", padx=6, pady=(6,2))
         for i, htxt in enumerate(("Letter","Shelf","Lower","Upper")):
-            ctk.CTkLabel(hdr, text=htxt, font=ctk.CTkFont(size=17, weight="bold")).grid(row=0, column=i, padx=10, sticky="w")
+            ctk.CTkLabel(hdr, text=htxt, font=app_font(17, "bold")).grid(row=0, column=i, padx=10, sticky="w")
 
         # shelves list for combobox
         shelves = [r[0] for r in db_fetchall("SELECT name FROM shelves ORDER BY name")]
@@ -1326,7 +1750,7 @@ class App(ctk.CTk):
 
         for i, L in enumerate(letters, start=1):
             rowf = ctk.CTkFrame(inner); rowf.grid(row=i, column=0, sticky="ew", padx=6, pady=3)
-            ctk.CTkLabel(rowf, text=L, width=70, anchor="w", font=ctk.CTkFont(size=17)).grid(row=0, column=0, padx=6)
+            ctk.CTkLabel(rowf, text=L, width=70, anchor="w", font=app_font(17)).grid(row=0, column=0, padx=6)
             s_cb = ctk.CTkComboBox(rowf, values=shelf_values, width=120)
             lo_e = ctk.CTkEntry(rowf, width=120)
             up_e = ctk.CTkEntry(rowf, width=120)
@@ -1362,7 +1786,7 @@ class App(ctk.CTk):
         # ---- Right: Shelf settings (add/rename/edit/delete)
         right = ctk.CTkFrame(container)
         right.grid(row=0, column=1, sticky="nsew", padx=(5,0))
-        ctk.CTkLabel(right, text="Shelf Settings", font=ctk.CTkFont(size=17, weight="bold")).pack(anchor="w", padx=10, pady=6)
+        ctk.CTkLabel(right, text="Shelf Settings", font=app_font(17, "bold")).pack(anchor="w", padx=10, pady=6)
 
         tablef = ctk.CTkFrame(right); tablef.pack(fill="both", expand=True, padx=8, pady=6)
         tv = ttk.Treeview(tablef, columns=("Name","Rows","Cols","Used%"), show="headings", height=14)
@@ -1498,21 +1922,25 @@ class App(ctk.CTk):
 
     # ---------- Patient Popup ----------
     def open_patient_popup(self, pid):
-        row = db_fetchone("SELECT name,address FROM patients WHERE id=?", (pid,))
-        pname, paddr = (row[0], row[1] or "") if row else ("","")
+        shown = self._patient_shown.get(str(pid))  # name/address as listed in the patient table
+        if shown:
+            pname, paddr = shown[0][:2]
+        else:
+            row = db_fetchone("SELECT name,address FROM patients WHERE id=?", (pid,))
+            pname, paddr = (row[0], row[1] or "") if row else ("","")
         win = ctk.CTkToplevel(self); win.title(f"Patient — {pname}")
-        win.geometry("1200x820"); win.lift(); win.attributes("-topmost", True)
+        win.geometry("1200x820")
         make_topmost(win)
 
         # Header
         head = ctk.CTkFrame(win, fg_color="#107c10"); head.pack(fill="x")
-        ctk.CTkLabel(head, text=f"Patient — {pname}", font=ctk.CTkFont(size=20, weight="bold")).pack(anchor="w", padx=12, pady=8)
+        ctk.CTkLabel(head, text=f"Patient — {pname}", font=app_font(20, "bold")).pack(anchor="w", padx=12, pady=8)
 
         # Patient info line
         info = ctk.CTkFrame(win); info.pack(fill="x", padx=12, pady=(10,6))
-        ctk.CTkLabel(info, text="Name", font=ctk.CTkFont(size=17)).grid(row=0, column=0, sticky="e", padx=6, pady=6)
+        ctk.CTkLabel(info, text="Name", font=app_font(17)).grid(row=0, column=0, sticky="e", padx=6, pady=6)
         name_e = ctk.CTkEntry(info, width=360); name_e.grid(row=0, column=1, padx=6, pady=6); name_e.insert(0, pname)
-        ctk.CTkLabel(info, text="Address", font=ctk.CTkFont(size=17)).grid(row=0, column=2, sticky="e", padx=6, pady=6)
+        ctk.CTkLabel(info, text="Address", font=app_font(17)).grid(row=0, column=2, sticky="e", padx=6, pady=6)
         addr_e = ctk.CTkEntry(info, width=360); addr_e.grid(row=0, column=3, padx=6, pady=6); addr_e.insert(0, paddr)
 
         ctk.CTkButton(
@@ -1527,46 +1955,73 @@ class App(ctk.CTk):
 
         ctk.CTkButton(
             info, text="🗑️ Clear All Prescriptions", fg_color="#D83B01", hover_color="#B32F00",
-            command=lambda: clear_all_prescriptions_with_led(win, pid, self.refresh_patient_table)
+            command=lambda: clear_all_prescriptions_with_led(win, pid, self.request_refresh)
         ).grid(row=0, column=6, padx=6)
 
         # Prescriptions table
         mid = ctk.CTkFrame(win); mid.pack(fill="both", expand=True, padx=12, pady=(6,8))
-        cols = ("Medication","Quantity","Date Added","Basket","Location")
-        rx = ttk.Treeview(mid, columns=cols, show="headings", selectmode="extended")
-        for c in cols:
-            rx.heading(c, text=c)
-            rx.column(c, width=230 if c!="Location" else 300, anchor="w")
+        rx = ttk.Treeview(mid, columns=TREE_COLS["rx"], show="headings", selectmode="extended")
+        configure_tree(rx, "rx")
         rx.pack(side="left", fill="both", expand=True)
         sb = ttk.Scrollbar(mid, orient="vertical", command=rx.yview)
         sb.pack(side="right", fill="y")
-        rx.configure(yscroll=sb.set)
         rx.tag_configure("odd", background="#f5f9ff")
         rx.tag_configure("even", background="#ffffff")
 
-        def populate_rx():
-            for r in rx.get_children(): rx.delete(r)
+        rx_next = [0]  # offset of the next page to load; None once all rows are in
+        rx_shown = {}  # iid -> (values, tag) currently in the tree
+        def fetch_rx(limit, offset):
+            # slot geometry (and a large basket's partner column) comes back with the rows
             rows2 = db_fetchall(
-                """SELECT id,medication,quantity,date_added,basket_size,slot_id
-                   FROM prescriptions WHERE patient_id=? ORDER BY id""",
-                (pid,)
+                """SELECT pr.id, pr.medication, pr.quantity, pr.date_added, pr.basket_size,
+                          a.shelf, a.row, a.col, b.col
+                   FROM prescriptions pr
+                   LEFT JOIN slots a ON a.id = pr.slot_id
+                   LEFT JOIN slots b ON LOWER(COALESCE(pr.basket_size,'small')) = 'large'
+                        AND b.shelf = a.shelf AND b.row = a.row AND b.col = a.col + 1
+                   WHERE pr.patient_id=? ORDER BY pr.id LIMIT ? OFFSET ?""",
+                (pid, limit, offset)
             )
-            for i,(prid, med, qty, dt, basket, sid) in enumerate(rows2):
-                date_disp = ""
-                if dt:
-                    for fmt in ("%Y-%m-%d %H:%M:%S","%Y-%m-%d"):
-                        try:
-                            date_disp = datetime.strptime(dt,fmt).strftime("%m/%d/%Y")
-                            break
-                        except:
-                            pass
+            sec = get_letter_section(get_patient_letter(pid))
+            out = []
+            for i,(prid, med, qty, dt, basket, shelf, row, col, pcol) in enumerate(rows2, offset):
                 # include warning flag if in wrong section
-                loc = pretty_location_for_prescription(pid, prid, basket, sid) if sid else ""
+                loc = ""
+                if shelf is not None:
+                    loc = section_checked_label(sec, shelf, row, col)
+                    if pcol is not None:
+                        loc += " & " + section_checked_label(sec, shelf, row, pcol)
+                out.append((str(prid), (med, qty if qty is not None else "", display_date(dt), basket or "", loc),
+                            "odd" if i%2 else "even"))
+            return out
+
+        def load_more_rx():
+            offset = rx_next[0]
+            if offset is None:
+                return
+            new = fetch_rx(PAGE_SIZE, offset)
+            rx_next[0] = offset + len(new) if len(new) == PAGE_SIZE else None
+            for iid, values, tag in new:
+                rx.insert("", "end", iid=iid, values=values, tags=(tag,))
+                rx_shown[iid] = (values, tag)
 
-                tag = "odd" if i%2 else "even"
-                rx.insert("", "end", iid=str(prid),
-                          values=(med, qty if qty is not None else "", date_disp, basket or "", loc),
-                          tags=(tag,))
+        def populate_rx():
+            # re-read the pages already loaded and touch only rows that changed
+            n = max(PAGE_SIZE, -(-len(rx_shown) // PAGE_SIZE) * PAGE_SIZE)
+            new = fetch_rx(n, 0)
+            rx_next[0] = n if len(new) == n else None
+            keep = {iid for iid, _v, _t in new}
+            gone = [iid for iid in rx_shown if iid not in keep]
+            if gone:
+                rx.delete(*gone)
+            for i, (iid, values, tag) in enumerate(new):
+                if iid not in rx_shown:
+                    rx.insert("", i, iid=iid, values=values, tags=(tag,))
+                elif rx_shown[iid] != (values, tag):
+                    rx.item(iid, values=values, tags=(tag,))
+            rx_shown.clear()
+            rx_shown.update((iid, (values, tag)) for iid, values, tag in new)
+        bind_lazy_paging(rx, sb, load_more_rx)
         populate_rx()
 
         def on_rx_double(_e):
@@ -1583,24 +2038,25 @@ class App(ctk.CTk):
                 messagebox.showinfo("Delete", "No prescription selected."); return
             if not messagebox.askyesno("Confirm", f"Delete {len(sel)} prescription(s)?"):
                 return
-            for item in sel:
-                prid = int(item)
-                row = db_fetchone("SELECT medication, slot_id, basket_size FROM prescriptions WHERE id=?", (prid,))
-                if not row: 
-                    continue
-                med, sid, b = row
-                if sid:
-                    if (b or "small").lower() == "large":
-        # free both primary and partner if present
-                        sids_to_free = expand_slots_for_large_display_or_freeing(prid)
-                        mark_slots_free([s for s in sids_to_free if s])
-                    else:
-                        mark_slots_free([sid])
-                db_exec("DELETE FROM prescriptions WHERE id=?", (prid,))
-
-                log_action(f"Deleted prescription '{med}' for patient_id={pid}")
+            ids = [int(item) for item in sel]
+            marks = ",".join("?" * len(ids))
+            with db_transaction() as cur:  # read, free and delete from one snapshot
+                rows = cur.execute(f"SELECT medication, slot_id, basket_size FROM prescriptions WHERE id IN ({marks})",
+                                   ids).fetchall()
+                sids = []
+                for med, sid, b in rows:
+                    if sid:
+                        sids.append(sid)
+                        if (b or "small").lower() == "large":
+                            # free both primary and partner if present
+                            partner = next_col_partner_slot_id(sid)
+                            if partner:
+                                sids.append(partner)
+                mark_slots_free(sids)
+                cur.execute(f"DELETE FROM prescriptions WHERE id IN ({marks})", ids)
+                log_action(f"Deleted {len(rows)} prescription(s) [{', '.join(med for med, _s, _b in rows)}] for patient_id={pid}")
             populate_rx()
-            self.refresh_patient_table()
+            self.request_refresh()
 
         def on_key(e):
             if e.keysym in ("Delete","BackSpace"):
@@ -1609,11 +2065,11 @@ class App(ctk.CTk):
 
         # Add prescription row
         addf = ctk.CTkFrame(win); addf.pack(fill="x", padx=12, pady=(4,12))
-        ctk.CTkLabel(addf, text="Medication", font=ctk.CTkFont(size=17)).grid(row=0, column=0, sticky="e", padx=6)
+        ctk.CTkLabel(addf, text="Medication", font=app_font(17)).grid(row=0, column=0, sticky="e", padx=6)
         med_e = ctk.CTkEntry(addf, width=220); med_e.grid(row=0, column=1, padx=6)
-        ctk.CTkLabel(addf, text="Quantity", font=ctk.CTkFont(size=17)).grid(row=0, column=2, sticky="e", padx=6)
+        ctk.CTkLabel(addf, text="Quantity", font=app_font(17)).grid(row=0, column=2, sticky="e", padx=6)
         qty_e = ctk.CTkEntry(addf, width=100); qty_e.grid(row=0, column=3, padx=6)
-        ctk.CTkLabel(addf, text="Basket", font=ctk.CTkFont(size=17)).grid(row=0, column=4, sticky="e", padx=6)
+        ctk.CTkLabel(addf, text="Basket", font=app_font(17)).grid(row=0, column=4, sticky="e", padx=6)
         basket_cb = ctk.CTkComboBox(addf, values=["small","large"], width=120)
         basket_cb.set("small"); basket_cb.grid(row=0, column=5, padx=6)
 
@@ -1632,14 +2088,16 @@ class App(ctk.CTk):
 
     def _save_patient(self, pid, name, addr, popup):
         db_exec("UPDATE patients SET name=?,address=? WHERE id=?", (name, addr, pid))
+        get_patient_letter.cache_clear()
+        format_slot_label_for_patient.cache_clear()
         log_action(f"Updated patient: {name}")
         popup.destroy()
-        self.refresh_patient_table()
+        self.request_refresh()
 
 
     def _light_up_patient(self, pid, parent):
-        rows = db_fetchall("SELECT slot_id FROM prescriptions WHERE patient_id=? AND slot_id IS NOT NULL", (pid,))
-        slots = list({r[0] for r in rows if r and r[0]})
+        rows = db_fetchall("SELECT DISTINCT slot_id FROM prescriptions WHERE patient_id=? AND slot_id IS NOT NULL", (pid,))
+        slots = [r[0] for r in rows if r[0]]
         if not slots:
             messagebox.showinfo("LED","No assigned locations for this patient."); return
         open_led_popup(parent, slots, "blue", "Patient Locations")  # popup text includes grid labels
@@ -1655,10 +2113,9 @@ class App(ctk.CTk):
         qv = int(qty) if qty.isdigit() else qty
 
         # Create the Rx row without slot; assign slot after family/bin flow
-        db_exec("""INSERT INTO prescriptions(patient_id,medication,quantity,date_added,basket_size)
-                   VALUES(?,?,?,?,?)""",
-                (pid, med, qv, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), basket))
-        pres_id = db_fetchone("SELECT id FROM prescriptions WHERE patient_id=? ORDER BY id DESC LIMIT 1", (pid,))[0]
+        pres_id = db_exec("""INSERT INTO prescriptions(patient_id,medication,quantity,date_added,basket_size)
+                             VALUES(?,?,?,?,?)""",
+                          (pid, med, qv, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), basket)).lastrowid
         log_action(f"Added prescription '{med}' for patient_id={pid} (basket={basket})")
 
         # (A) family-bin multi-option → on_select handles assignment and LEDs
@@ -1667,17 +2124,17 @@ class App(ctk.CTk):
             res = auto_assign_for_patient(pid, basket)  # returns (slot_ids, shelf) or None
             if not res:
                 messagebox.showwarning("No Slot","No automatic slot available; please assign manually.")
-                return manual_assign_popup(parent, pres_id, lambda: (refresh_cb(), self.refresh_patient_table()))
+                return manual_assign_popup(parent, pres_id, lambda: (refresh_cb(), self.request_refresh()))
             slot_ids, shelf = res
             # show confirm → if confirmed, occupy, update, LEDs (inside helper)
             confirm_auto_assign_popup(parent, pres_id, slot_ids, shelf,
-                          lambda: (refresh_cb(), self.refresh_patient_table()))
+                          lambda: (refresh_cb(), self.request_refresh()))
 
 
         # IMPORTANT: use correct callback name `on_select` (NOT `on_done`)
         try_family_bin_popup(
     parent, pid, address, pres_id,
-    on_done=lambda: (refresh_cb(), self.refresh_patient_table()),
+    on_done=lambda: (refresh_cb(), self.request_refresh()),
     on_no_family=after_no_family
 )
 
@@ -1687,11 +2144,11 @@ class App(ctk.CTk):
     # ----- Edit Prescription -----
     def _edit_prescription_popup(self, patient_id, pres_id, refresh_cb):
         e = ctk.CTkToplevel(self); e.title("Edit Prescription")
-        e.geometry("680x560"); e.lift(); e.attributes("-topmost", True)
+        e.geometry("680x560")
         make_topmost(e)
 
         head = ctk.CTkFrame(e, fg_color="#0b5cab"); head.pack(fill="x")
-        ctk.CTkLabel(head, text="Edit Prescription", font=ctk.CTkFont(size=20, weight="bold")).pack(anchor="w", padx=12, pady=8)
+        ctk.CTkLabel(head, text="Edit Prescription", font=app_font(20, "bold")).pack(anchor="w", padx=12, pady=8)
 
         row = db_fetchone(
             """SELECT medication,quantity,date_added,basket_size,slot_id
@@ -1703,27 +2160,22 @@ class App(ctk.CTk):
         med, qty, dt, basket, slot_id = row
 
         body = ctk.CTkFrame(e); body.pack(fill="both", expand=True, padx=12, pady=10)
-        ctk.CTkLabel(body, text="Medication", font=ctk.CTkFont(size=17)).grid(row=0, column=0, sticky="e", padx=6, pady=6)
+        ctk.CTkLabel(body, text="Medication", font=app_font(17)).grid(row=0, column=0, sticky="e", padx=6, pady=6)
         med_e = ctk.CTkEntry(body, width=320); med_e.grid(row=0, column=1, padx=6, pady=6); med_e.insert(0, med)
 
-        ctk.CTkLabel(body, text="Quantity", font=ctk.CTkFont(size=17)).grid(row=1, column=0, sticky="e", padx=6, pady=6)
+        ctk.CTkLabel(body, text="Quantity", font=app_font(17)).grid(row=1, column=0, sticky="e", padx=6, pady=6)
         qty_e = ctk.CTkEntry(body, width=160); qty_e.grid(row=1, column=1, padx=6, pady=6); qty_e.insert(0, str(qty) if qty is not None else "")
 
-        ctk.CTkLabel(body, text="Date (MM/DD/YYYY)", font=ctk.CTkFont(size=17)).grid(row=2, column=0, sticky="e", padx=6, pady=6)
+        ctk.CTkLabel(body, text="Date (MM/DD/YYYY)", font=app_font(17)).grid(row=2, column=0, sticky="e", padx=6, pady=6)
         date_e = ctk.CTkEntry(body, width=180); date_e.grid(row=2, column=1, padx=6, pady=6)
         if dt:
-            for fmt in ("%Y-%m-%d %H:%M:%S","%Y-%m-%d"):
-                try:
-                    date_e.insert(0, datetime.strptime(dt,fmt).strftime("%m/%d/%Y"))
-                    break
-                except:
-                    pass
+            date_e.insert(0, display_date(dt))
 
-        ctk.CTkLabel(body, text="Basket", font=ctk.CTkFont(size=17)).grid(row=3, column=0, sticky="e", padx=6, pady=6)
+        ctk.CTkLabel(body, text="Basket", font=app_font(17)).grid(row=3, column=0, sticky="e", padx=6, pady=6)
         b_cb = ctk.CTkComboBox(body, values=["small","large"], width=140)
         b_cb.set(basket if basket in ("small","large") else "small"); b_cb.grid(row=3, column=1, padx=6, pady=6)
 
-        ctk.CTkLabel(body, text="LED Location (F-A61 or id)", font=ctk.CTkFont(size=17)).grid(row=4, column=0, sticky="e", padx=6, pady=6)
+        ctk.CTkLabel(body, text="LED Location (F-A61 or id)", font=app_font(17)).grid(row=4, column=0, sticky="e", padx=6, pady=6)
         loc_e = ctk.CTkEntry(body, width=220); loc_e.grid(row=4, column=1, padx=6, pady=6)
         loc_e.insert(0, slot_id_to_label(slot_id) if slot_id else "")
 
@@ -1745,26 +2197,43 @@ class App(ctk.CTk):
             if new_sid and new_sid != slot_id:
                 if not messagebox.askyesno("Confirm","Manually change LED slot? (occupied check enforced)"):
                     return
-                occ = db_fetchone("SELECT occupied FROM slots WHERE id=?", (new_sid,))
-                if not occ: messagebox.showerror("Error","Slot not found"); return
-                if occ[0] == 1: messagebox.showerror("Error","Slot already occupied"); return
-                if slot_id: mark_slots_free([slot_id])     # free old slot
-                mark_slots_occupied([new_sid])             # occupy new slot
-                db_exec("UPDATE prescriptions SET slot_id=? WHERE id=?", (new_sid, pres_id))
+            else:
+                new_sid = slot_id
+
+            err = None
+            with db_transaction():
+                if new_sid != slot_id:
+                    # free old + occupy new in one statement; the occupied check is part
+                    # of the WHERE so nothing changes if the new slot is taken
+                    cur = db_exec(
+                        """UPDATE slots SET occupied = CASE id WHEN ? THEN 1 ELSE 0 END
+                           WHERE id IN (?,?) AND (SELECT occupied FROM slots WHERE id=?)=0""",
+                        (new_sid, new_sid, slot_id, new_sid)
+                    )
+                    if cur.rowcount == 0:
+                        found = db_fetchone("SELECT 1 FROM slots WHERE id=?", (new_sid,))
+                        err = "Slot already occupied" if found else "Slot not found"
+                    else:
+                        _patch_slot_grid([slot_id], 0)
+                        _patch_slot_grid([new_sid], 1)
+                if not err:
+                    db_exec(
+                        """UPDATE prescriptions
+                           SET medication=?, quantity=?, date_added=?, basket_size=?, slot_id=?
+                           WHERE id=?""",
+                        (new_med, int(new_qty) if new_qty.isdigit() else new_qty, d, new_b, new_sid, pres_id)
+                    )
+            if err:
+                messagebox.showerror("Error", err); return
+            _mark_occupancy_dirty()  # basket size may have changed the large-basket partner
+            if new_sid != slot_id:
                 log_action(f"Changed prescription id={pres_id} location to {slot_id_to_label(new_sid)}")
-
-            db_exec(
-                """UPDATE prescriptions
-                   SET medication=?, quantity=?, date_added=?, basket_size=?
-                   WHERE id=?""",
-                (new_med, int(new_qty) if new_qty.isdigit() else new_qty, d, new_b, pres_id)
-            )
             log_action(f"Edited prescription id={pres_id} (med='{new_med}', qty='{new_qty}', basket='{new_b}')")
-            e.destroy(); refresh_cb(); self.refresh_patient_table()
+            e.destroy(); refresh_cb(); self.request_refresh()
 
         def auto_assign_here():
             # Always attempt to consolidate into earliest free slot in correct section
-            auto_reassign_in_section(self, pres_id, lambda: (refresh_cb(), self.refresh_patient_table()))
+            auto_reassign_in_section(self, pres_id, lambda: (refresh_cb(), self.request_refresh()))
 
         btnf = ctk.CTkFrame(body); btnf.grid(row=5, column=0, columnspan=2, pady=12)
         ctk.CTkButton(btnf, text="💾 Save Changes", width=150, fg_color="#0B5CAB", hover_color="#084b8a",
@@ -1776,11 +2245,11 @@ class App(ctk.CTk):
     # ---------- Shelf Assignment (left: sections, right: shelf settings) ----------
     def open_shelf_assignment(self):
         win = ctk.CTkToplevel(self); win.title("Shelf Assignment")
-        win.geometry("1200x860"); win.lift(); win.attributes("-topmost", True)
+        win.geometry("1200x860")
         make_topmost(win)
 
         head = ctk.CTkFrame(win, fg_color="#0b5cab"); head.pack(fill="x")
-        ctk.CTkLabel(head, text="Shelf Assignment", font=ctk.CTkFont(size=20, weight="bold")).pack(anchor="w", padx=12, pady=8)
+        ctk.CTkLabel(head, text="Shelf Assignment", font=app_font(20, "bold")).pack(anchor="w", padx=12, pady=8)
 
         container = ctk.CTkFrame(win); container.pack(fill="both", expand=True, padx=10, pady=10)
         container.grid_columnconfigure(0, weight=1)
@@ -1790,7 +2259,7 @@ class App(ctk.CTk):
         left = ctk.CTkFrame(container)
         left.grid(row=0, column=0, sticky="nsew", padx=(0,5))
 
-        ctk.CTkLabel(left, text="Letter Sections (Bounds like A1..D20)", font=ctk.CTkFont(size=17, weight="bold")).pack(anchor="w", padx=10, pady=6)
+        ctk.CTkLabel(left, text="Letter Sections (Bounds like A1..D20)", font=app_font(17, "bold")).pack(anchor="w", padx=10, pady=6)
 
         letters_frame = ctk.CTkFrame(left)
         letters_frame.pack(fill="both", expand=True, padx=6, pady=6)
@@ -1810,7 +2279,7 @@ class App(ctk.CTk):
         # table header
         hdr = ctk.CTkFrame(inner); hdr.grid(row=0, column=0, sticky="ew", padx=6, pady=(6,2))
         for i, htxt in enumerate(("Letter","Shelf","Lower","Upper")):
-            ctk.CTkLabel(hdr, text=htxt, font=ctk.CTkFont(size=17, weight="bold")).grid(row=0, column=i, padx=10, sticky="w")
+            ctk.CTkLabel(hdr, text=htxt, font=app_font(17, "bold")).grid(row=0, column=i, padx=10, sticky="w")
 
         # shelves list for combobox
         shelves = [r[0] for r in db_fetchall("SELECT name FROM shelves ORDER BY name")]
@@ -1819,20 +2288,18 @@ class App(ctk.CTk):
         self.letter_widgets = {}
         letters = [chr(i) for i in range(65, 91)] + ["Overflow"]
         # ensure each letter row exists
-        for L in letters:
-            if not db_fetchone("SELECT 1 FROM letter_sections WHERE letter=?", (L,)):
-                db_exec("INSERT INTO letter_sections(letter,shelf,lower_bound,upper_bound) VALUES(?,?,?,?)",
-                        (L, "", "", ""))
+        seed_letter_sections_if_missing()
+        current = {r[0]: r[1:] for r in db_fetchall("SELECT letter,shelf,lower_bound,upper_bound FROM letter_sections")}
 
         for i, L in enumerate(letters, start=1):
             rowf = ctk.CTkFrame(inner); rowf.grid(row=i, column=0, sticky="ew", padx=6, pady=3)
-            ctk.CTkLabel(rowf, text=L, width=70, anchor="w", font=ctk.CTkFont(size=17)).grid(row=0, column=0, padx=6)
+            ctk.CTkLabel(rowf, text=L, width=70, anchor="w", font=app_font(17)).grid(row=0, column=0, padx=6)
             s_cb = ctk.CTkComboBox(rowf, values=shelf_values, width=120)
             lo_e = ctk.CTkEntry(rowf, width=120)
             up_e = ctk.CTkEntry(rowf, width=120)
             s_cb.grid(row=0, column=1, padx=6); lo_e.grid(row=0, column=2, padx=6); up_e.grid(row=0, column=3, padx=6)
 
-            r = db_fetchone("SELECT shelf,lower_bound,upper_bound FROM letter_sections WHERE letter=?", (L,))
+            r = current.get(L)
             if r:
                 s_cb.set(r[0] or "")
                 if r[1]: lo_e.insert(0, r[1])
@@ -1840,16 +2307,21 @@ class App(ctk.CTk):
 
             self.letter_widgets[L] = (s_cb, lo_e, up_e)
         def save_all_letters():
+            known = {r[0] for r in db_fetchall("SELECT name FROM shelves")}
+            rows = []
             for L,(s, lo, up) in self.letter_widgets.items():
                 S, LO, UP = (s.get() or "").strip().upper(), lo.get().strip().upper(), up.get().strip().upper()
-                if S and not db_fetchone("SELECT 1 FROM shelves WHERE name=?", (S,)):
+                if S and S not in known:
                     messagebox.showerror("Error", f"Shelf '{S}' does not exist for letter {L}."); return
                 if LO and not parse_bound(LO):
                     messagebox.showerror("Error", f"Lower bound invalid for {L}: {LO}"); return
                 if UP and not parse_bound(UP):
                     messagebox.showerror("Error", f"Upper bound invalid for {L}: {UP}"); return
-                db_exec("INSERT OR REPLACE INTO letter_sections(letter,shelf,lower_bound,upper_bound) VALUES(?,?,?,?)",
-                        (L, S, LO, UP))
+                rows.append((L, S, LO, UP))
+            with db_transaction() as cur:
+                cur.executemany("INSERT OR REPLACE INTO letter_sections(letter,shelf,lower_bound,upper_bound) VALUES(?,?,?,?)",
+                                rows)
+            _invalidate_letter_sections()
             log_action("Updated letter sections")
             win.destroy()
 
@@ -1861,13 +2333,11 @@ class App(ctk.CTk):
         # ---- Right: Shelf settings (add/rename/edit/delete)
         right = ctk.CTkFrame(container)
         right.grid(row=0, column=1, sticky="nsew", padx=(5,0))
-        ctk.CTkLabel(right, text="Shelf Settings", font=ctk.CTkFont(size=17, weight="bold")).pack(anchor="w", padx=10, pady=6)
+        ctk.CTkLabel(right, text="Shelf Settings", font=app_font(17, "bold")).pack(anchor="w", padx=10, pady=6)
 
         tablef = ctk.CTkFrame(right); tablef.pack(fill="both", expand=True, padx=8, pady=6)
-        tv = ttk.Treeview(tablef, columns=("Name","Rows","Cols","Used%"), show="headings", height=14)
-        for c in ("Name","Rows","Cols","Used%"):
-            tv.heading(c, text=c)
-            tv.column(c, width=120 if c!="Name" else 160, anchor="w")
+        tv = ttk.Treeview(tablef, columns=TREE_COLS["shelves"], show="headings", height=14)
+        configure_tree(tv, "shelves")
         tv.pack(side="left", fill="both", expand=True)
         sb = ttk.Scrollbar(tablef, orient="vertical", command=tv.yview)
         sb.pack(side="right", fill="y")
@@ -1875,10 +2345,7 @@ class App(ctk.CTk):
 
         def refresh_shelves_tv():
             for r in tv.get_children(): tv.delete(r)
-            rows = db_fetchall("SELECT name, rows_count, cols_count FROM shelves ORDER BY name")
-            for name, rc, cc in rows:
-                used = db_fetchone("SELECT COUNT(*) FROM slots WHERE shelf=? AND occupied=1", (name,))[0]
-                total = db_fetchone("SELECT COUNT(*) FROM slots WHERE shelf=?", (name,))[0]
+            for name, rc, cc, used, total in get_shelf_usage():
                 pct = f"{int(100*used/total)}%" if total else "0%"
                 tv.insert("", "end", iid=name, values=(name, rc or 0, cc or 0, pct))
         refresh_shelves_tv()
@@ -1920,9 +2387,10 @@ class App(ctk.CTk):
             if not messagebox.askyesno("Confirm", f"Add shelf {name} with {rows_count} rows × {cols_count} cols?"):
                 return
 
-            db_exec("INSERT INTO shelves(name,rows_count,cols_count) VALUES(?,?,?)",
-                    (name, rows_count, cols_count))
-            populate_slots_for_shelf(name, rows_count, cols_count)
+            with db_transaction():
+                db_exec("INSERT INTO shelves(name,rows_count,cols_count) VALUES(?,?,?)",
+                        (name, rows_count, cols_count))
+                populate_slots_for_shelf(name, rows_count, cols_count)
             log_action(f"Added shelf {name} ({rows_count} rows, {cols_count} cols)")
             refresh_shelves_tv()
 
@@ -1942,19 +2410,23 @@ class App(ctk.CTk):
                     f"Apply changes to shelf '{current}' → name={new_name}, rows={rows_count}, cols={cols_count}?"):
                 return
 
-            # rename cascade (shelves.name, slots.shelf, letter_sections.shelf)
+            if new_name != current and db_fetchone("SELECT 1 FROM shelves WHERE name=?", (new_name,)):
+                messagebox.showerror("Error","New shelf name already exists."); return
+
+            # rename cascade + metadata in one transaction so a failure can't leave
+            # slots/letter_sections pointing at a shelf name that no longer exists
+            with db_transaction():
+                if new_name != current:
+                    db_exec("UPDATE shelves SET name=? WHERE name=?", (new_name, current))
+                    db_exec("UPDATE slots SET shelf=? WHERE shelf=?", (new_name, current))
+                    db_exec("UPDATE letter_sections SET shelf=? WHERE shelf=?", (new_name, current))
+                db_exec("UPDATE shelves SET rows_count=?, cols_count=? WHERE name=?", (rows_count, cols_count, new_name))
+                # add any missing slots only (no deletions)
+                populate_slots_for_shelf(new_name, rows_count, cols_count)
             if new_name != current:
-                if db_fetchone("SELECT 1 FROM shelves WHERE name=?", (new_name,)):
-                    messagebox.showerror("Error","New shelf name already exists."); return
-                db_exec("UPDATE shelves SET name=? WHERE name=?", (new_name, current))
-                db_exec("UPDATE slots SET shelf=? WHERE shelf=?", (new_name, current))
-                db_exec("UPDATE letter_sections SET shelf=? WHERE shelf=?", (new_name, current))
+                _invalidate_slot_cache()
+                _invalidate_letter_sections()
                 log_action(f"Renamed shelf {current} → {new_name}")
-
-            # update metadata
-            db_exec("UPDATE shelves SET rows_count=?, cols_count=? WHERE name=?", (rows_count, cols_count, new_name))
-            # add any missing slots only (no deletions)
-            populate_slots_for_shelf(new_name, rows_count, cols_count)
             log_action(f"Edited shelf {new_name} -> rows={rows_count}, cols={cols_count}")
             refresh_shelves_tv()
 
@@ -1976,8 +2448,10 @@ class App(ctk.CTk):
                 messagebox.showerror("Error", "Letter sections reference this shelf. Clear them first."); return
             if not messagebox.askyesno("Confirm", f"Delete shelf {name}? This deletes its slots."):
                 return
-            db_exec("DELETE FROM slots WHERE shelf=?", (name,))
-            db_exec("DELETE FROM shelves WHERE name=?", (name,))
+            with db_transaction():
+                db_exec("DELETE FROM slots WHERE shelf=?", (name,))
+                db_exec("DELETE FROM shelves WHERE name=?", (name,))
+            _invalidate_slot_cache()
             log_action(f"Deleted shelf {name}")
             refresh_shelves_tv()
 
@@ -1990,15 +2464,12 @@ class App(ctk.CTk):
                       command=delete_shelf).pack(side="left", padx=6)
     # ---------- Overdue Tab ----------
     def open_overdue_tab(self):
-        data = get_overdue_prescriptions(14)
-        agg = aggregate_overdue_by_patient(data)
-
         win = ctk.CTkToplevel(self); win.title("Overdue Medications")
-        win.geometry("1120x780"); win.lift(); win.attributes("-topmost", True)
+        win.geometry("1120x780")
         make_topmost(win)
 
         head = ctk.CTkFrame(win, fg_color="#c50f1f"); head.pack(fill="x")
-        ctk.CTkLabel(head, text="Overdue Medications", font=ctk.CTkFont(size=20, weight="bold")).pack(anchor="w", padx=12, pady=8)
+        ctk.CTkLabel(head, text="Overdue Medications", font=app_font(20, "bold")).pack(anchor="w", padx=12, pady=8)
 
         # Controls: threshold filter + light up
         top = ctk.CTkFrame(win); top.pack(fill="x", padx=10, pady=8)
@@ -2012,84 +2483,97 @@ class App(ctk.CTk):
                 d = int(threshold_var.get().strip())
             except:
                 messagebox.showerror("Error","Enter an integer number of days."); return
-            new_data = get_overdue_prescriptions(d)
-            new_agg = aggregate_overdue_by_patient(new_data)
-            rebuild_table(new_agg)
-            count_lbl.configure(text=f"Total overdue prescriptions: {len(new_data)}")
+            rebuild_table(d)
+
+        def light_up_shown():
+            # slots come from the totals taken with the table; no need to re-run the overdue query
+            slots = win._overdue_slots
+            if not slots:
+                messagebox.showinfo("LED","No overdue items with assigned slots."); return
+            open_led_popup(win, slots, "red", "Overdue — LED")
 
         ctk.CTkButton(top, text="Apply Filter", command=refresh_threshold).pack(side="left", padx=6)
         ctk.CTkButton(top, text="🔴 Light Up All Overdue", fg_color="#D83B01", hover_color="#B32F00",
-                      command=lambda: self._light_up_overdue(get_overdue_prescriptions(int(threshold_var.get() or "14")), win)
-                      ).pack(side="left", padx=8)
-        count_lbl = ctk.CTkLabel(top, text=f"Total overdue prescriptions: {len(data)}")
+                      command=light_up_shown).pack(side="left", padx=8)
+        count_lbl = ctk.CTkLabel(top, text="")
         count_lbl.pack(side="right", padx=6)
 
         # Table
         tablef = ctk.CTkFrame(win); tablef.pack(fill="both", expand=True, padx=10, pady=10)
-        cols = ("Patient","Address","# Overdue","Oldest (days)","Locations")
-        tv = ttk.Treeview(tablef, columns=cols, show="headings")
-        for c in cols:
-            tv.heading(c, text=c)
-            tv.column(c, width=220 if c!="Locations" else 380, anchor="w")
+        tv = ttk.Treeview(tablef, columns=TREE_COLS["overdue"], show="headings")
+        configure_tree(tv, "overdue")
         tv.pack(side="left", fill="both", expand=True)
         sb = ttk.Scrollbar(tablef, orient="vertical", command=tv.yview)
         sb.pack(side="right", fill="y")
-        tv.configure(yscroll=sb.set)
         tv.tag_configure("odd", background="#f5f9ff")
         tv.tag_configure("even", background="#ffffff")
 
-        def rebuild_table(agg_map):
-            for r in tv.get_children(): tv.delete(r)
-            for i,(pid, v) in enumerate(agg_map.items()):
-                locs = ", ".join([slot_id_to_label(s) for s in sorted(list(v["slots"])) if s])
-                tag = "odd" if i%2 else "even"
+        od_page = [14, 0]  # threshold days, offset of the next patient page (None once all are in)
+        def load_more_overdue():
+            days, offset = od_page
+            if offset is None:
+                return
+            agg_map = get_overdue_by_patient(days, PAGE_SIZE, offset)
+            od_page[1] = offset + len(agg_map) if len(agg_map) == PAGE_SIZE else None
+            sids = list(set().union(*(v["slots"] for v in agg_map.values())))
+            labels = dict(zip(sids, slot_ids_to_labels(sids)))
+            for i,(pid, v) in enumerate(agg_map.items(), offset):
+                locs = ", ".join([labels[s] for s in sorted(v["slots"]) if s])
                 tv.insert("", "end", iid=str(pid),
                           values=(v["name"], v["address"] or "", v["count"], v["oldest"], locs),
-                          tags=(tag,))
+                          tags=(ROW_TAGS[i & 1],))
 
-        rebuild_table(agg)
-        tv.bind("<Double-1>", lambda e: self._open_overdue_patient_detail(tv, int(threshold_var.get() or "14")))
+        def rebuild_table(days):
+            tv.delete(*tv.get_children())
+            count, win._overdue_slots = get_overdue_totals(days)
+            count_lbl.configure(text=f"Total overdue prescriptions: {count}")
+            od_page[:] = [days, 0]
+            load_more_overdue()
+
+        bind_lazy_paging(tv, sb, load_more_overdue)
+        rebuild_table(14)
+        # detail uses the applied threshold, so it agrees with the table even if the entry was edited since
+        tv.bind("<Double-1>", lambda e: self._open_overdue_patient_detail(tv, od_page[0]))
 
     def _open_overdue_patient_detail(self, tree, threshold_days=14):
         sel = tree.selection()
         if not sel: return
         pid = int(sel[0])
-        items = [o for o in get_overdue_prescriptions(threshold_days) if o["patient_id"] == pid]
+        items = get_overdue_prescriptions(threshold_days, patient_id=pid)
         if not items:
             messagebox.showinfo("Overdue","No overdue items (refresh?)"); return
 
         win = ctk.CTkToplevel(self); win.title("Overdue Details")
-        win.geometry("900x560"); win.lift(); win.attributes("-topmost", True)
+        win.geometry("900x560")
         make_topmost(win)
 
         head = ctk.CTkFrame(win, fg_color="#c50f1f"); head.pack(fill="x")
-        ctk.CTkLabel(head, text=f"Overdue — {items[0]['name']}", font=ctk.CTkFont(size=20, weight="bold")).pack(anchor="w", padx=12, pady=8)
+        ctk.CTkLabel(head, text=f"Overdue — {items[0]['name']}", font=app_font(20, "bold")).pack(anchor="w", padx=12, pady=8)
 
         top = ctk.CTkFrame(win); top.pack(fill="x", padx=10, pady=8)
         ctk.CTkButton(top, text="🔴 Light Up These", fg_color="#D83B01", hover_color="#B32F00",
                       command=lambda: self._light_up_overdue(items, win)).pack(side="left")
 
         tablef = ctk.CTkFrame(win); tablef.pack(fill="both", expand=True, padx=10, pady=10)
-        cols = ("Medication","Quantity","Days Overdue","Location")
-        tv = ttk.Treeview(tablef, columns=cols, show="headings")
-        for c in cols:
-            tv.heading(c, text=c)
-            tv.column(c, width=220 if c!="Location" else 260, anchor="w")
+        tv = ttk.Treeview(tablef, columns=TREE_COLS["overdue_detail"], show="headings")
+        configure_tree(tv, "overdue_detail")
         tv.pack(side="left", fill="both", expand=True)
         sb = ttk.Scrollbar(tablef, orient="vertical", command=tv.yview)
         sb.pack(side="right", fill="y")
         tv.configure(yscroll=sb.set)
 
+        sids = [it["slot_id"] for it in items if it["slot_id"]]
+        labels = dict(zip(sids, slot_ids_to_labels(sids)))
         for it in items:
-            loc = slot_id_to_label(it["slot_id"]) if it["slot_id"] else ""
+            loc = labels.get(it["slot_id"], "")
             tv.insert("", "end", values=(it["medication"], it["quantity"], it["days_overdue"], loc))
 
     def _light_up_overdue(self, items_or_list, parent):
         # accepts either full items or list from get_overdue_prescriptions
         if isinstance(items_or_list, list) and items_or_list and isinstance(items_or_list[0], dict):
-            slots = sorted(list({it["slot_id"] for it in items_or_list if it["slot_id"]}))
+            slots = sorted({it["slot_id"] for it in items_or_list if it["slot_id"]})
         else:
-            slots = sorted(list({it["slot_id"] for it in get_overdue_prescriptions(14) if it["slot_id"]}))
+            slots = sorted({it["slot_id"] for it in get_overdue_prescriptions(14) if it["slot_id"]})
         if not slots:
             messagebox.showinfo("LED","No overdue items with assigned slots."); return
         open_led_popup(parent, slots, "red", "Overdue — LED")
@@ -2098,23 +2582,21 @@ class App(ctk.CTk):
     # ---------- Dashboard ----------
     def open_dashboard_tab(self):
         win = ctk.CTkToplevel(self); win.title("Dashboard")
-        win.geometry("1200x820"); win.lift(); win.attributes("-topmost", True)
-        make_topmost(win)
+        win.geometry("1200x820")
+        make_topmost(win, modal=False)  # read-only view
 
         head = ctk.CTkFrame(win, fg_color="#0b5cab"); head.pack(fill="x")
-        ctk.CTkLabel(head, text="Dashboard", font=ctk.CTkFont(size=20, weight="bold")).pack(anchor="w", padx=12, pady=8)
+        ctk.CTkLabel(head, text="Dashboard", font=app_font(20, "bold")).pack(anchor="w", padx=12, pady=8)
 
         top = ctk.CTkFrame(win); top.pack(fill="x", padx=12, pady=10)
-        total_patients = db_fetchone("SELECT COUNT(*) FROM patients")[0]
-        total_rx = db_fetchone("SELECT COUNT(*) FROM prescriptions")[0]
-        assigned = db_fetchone("SELECT COUNT(*) FROM prescriptions WHERE slot_id IS NOT NULL")[0]
+        total_patients, total_rx, assigned = get_dashboard_counts()
         unassigned = total_rx - assigned
 
         cards = ctk.CTkFrame(top); cards.pack(fill="x")
         def metric(frame, title, value):
             f = ctk.CTkFrame(frame); f.pack(side="left", padx=12)
-            ctk.CTkLabel(f, text=title, font=ctk.CTkFont(size=16, weight="bold")).pack(pady=(8,2))
-            ctk.CTkLabel(f, text=str(value), font=ctk.CTkFont(size=24, weight="bold")).pack(pady=(0,10))
+            ctk.CTkLabel(f, text=title, font=app_font(16, "bold")).pack(pady=(8,2))
+            ctk.CTkLabel(f, text=str(value), font=app_font(24, "bold")).pack(pady=(0,10))
         metric(cards, "Patients", total_patients)
         metric(cards, "Prescriptions", total_rx)
         metric(cards, "Assigned", assigned)
@@ -2122,20 +2604,14 @@ class App(ctk.CTk):
 
         # capacity by shelf
         body = ctk.CTkFrame(win); body.pack(fill="both", expand=True, padx=12, pady=10)
-        cols = ("Shelf","Used","Total","Used %")
-        tv = ttk.Treeview(body, columns=cols, show="headings")
-        for c in cols:
-            tv.heading(c, text=c)
-            tv.column(c, width=150, anchor="w")
+        tv = ttk.Treeview(body, columns=TREE_COLS["usage"], show="headings")
+        configure_tree(tv, "usage")
         tv.pack(side="left", fill="both", expand=True)
         sb = ttk.Scrollbar(body, orient="vertical", command=tv.yview)
         sb.pack(side="right", fill="y")
         tv.configure(yscroll=sb.set)
 
-        rows = db_fetchall("SELECT name FROM shelves ORDER BY name")
-        for (nm,) in rows:
-            used = db_fetchone("SELECT COUNT(*) FROM slots WHERE shelf=? AND occupied=1", (nm,))[0]
-            total = db_fetchone("SELECT COUNT(*) FROM slots WHERE shelf=?", (nm,))[0]
+        for nm, _r, _c, used, total in get_shelf_usage():
             pct = f"{int(100*used/total)}%" if total else "0%"
             tv.insert("", "end", values=(nm, used, total, pct))
 
@@ -2143,41 +2619,42 @@ class App(ctk.CTk):
     # ---------- Previous Actions ----------
     def open_actions_tab(self):
         win = ctk.CTkToplevel(self); win.title("Previous Actions")
-        win.geometry("1020x660"); win.lift(); win.attributes("-topmost", True)
+        win.geometry("1020x660")
         make_topmost(win)
 
         head = ctk.CTkFrame(win, fg_color="#6b6b6b"); head.pack(fill="x")
-        ctk.CTkLabel(head, text="Previous Actions (Today)", font=ctk.CTkFont(size=20, weight="bold")).pack(anchor="w", padx=12, pady=8)
+        ctk.CTkLabel(head, text="Previous Actions (Today)", font=app_font(20, "bold")).pack(anchor="w", padx=12, pady=8)
 
         tablef = ctk.CTkFrame(win); tablef.pack(fill="both", expand=True, padx=10, pady=10)
-        cols = ("Time","Actor","Action")
-        tv = ttk.Treeview(tablef, columns=cols, show="headings")
-        for c in cols:
-            tv.heading(c, text=c)
-            tv.column(c, width=160 if c!="Action" else 760, anchor="w")
+        tv = ttk.Treeview(tablef, columns=TREE_COLS["actions"], show="headings")
+        configure_tree(tv, "actions")
         tv.pack(side="left", fill="both", expand=True)
         sb = ttk.Scrollbar(tablef, orient="vertical", command=tv.yview)
         sb.pack(side="right", fill="y")
-        tv.configure(yscroll=sb.set)
         tv.tag_configure("odd", background="#f5f9ff")
         tv.tag_configure("even", background="#ffffff")
 
-        acts = get_todays_actions(300)
-        for i,(ts,actor,action) in enumerate(acts):
-            t = ts.split(" ")[1] if " " in ts else ts
-            tag = "odd" if i%2 else "even"
-            tv.insert("", "end", values=(t,actor,action), tags=(tag,))
-
-        ctk.CTkButton(win, text="🔄 Refresh",
-                      command=lambda: self._refresh_actions(tv)).pack(pady=8)
-
-    def _refresh_actions(self, tv):
-        for r in tv.get_children(): tv.delete(r)
-        acts = get_todays_actions(300)
-        for i,(ts,actor,action) in enumerate(acts):
-            t = ts.split(" ")[1] if " " in ts else ts
-            tag = "odd" if i%2 else "even"
-            tv.insert("", "end", values=(t,actor,action), tags=(tag,))
+        act_next = [0]  # offset of the next page to load; None once all of today's rows are in
+        def load_more_actions():
+            offset = act_next[0]
+            if offset is None:
+                return
+            acts = get_todays_actions(PAGE_SIZE, offset)
+            act_next[0] = offset + len(acts) if len(acts) == PAGE_SIZE else None
+            for i,(ts,actor,action) in enumerate(acts, offset):
+                t = ts.split(" ")[1] if " " in ts else ts
+                tv.insert("", "end", values=(t,actor,action), tags=(ROW_TAGS[i & 1],))
+
+        def refresh_actions():
+            tv.delete(*tv.get_children())
+            act_next[0] = 0
+            load_more_actions()
+
+        bind_lazy_paging(tv, sb, load_more_actions)
+        refresh_actions()
+
+        ctk.CTkButton(win, text="🔄 Refresh", command=refresh_actions).pack(pady=8)
+
     # ----- Edit Prescription -----
 # ================================
 # Pharmacy LED System - Part 6
@@ -2187,10 +2664,10 @@ class App(ctk.CTk):
 def seed_letter_sections_if_missing():
     # Ensure A..Z + Overflow exist
     letters = [chr(i) for i in range(65,91)] + ["Overflow"]
-    for L in letters:
-        if not db_fetchone("SELECT 1 FROM letter_sections WHERE letter=?", (L,)):
-            db_exec("INSERT INTO letter_sections(letter,shelf,lower_bound,upper_bound) VALUES(?,?,?,?)",
-                    (L, "", "", ""))
+    with db_transaction() as cur:
+        cur.executemany("INSERT OR IGNORE INTO letter_sections(letter,shelf,lower_bound,upper_bound) VALUES(?,?,?,?)",
+                        [(L, "", "", "") for L in letters])
+    _invalidate_letter_sections()
 
 if __name__ == "__main__":
     print("Database path:", DB_PATH)